@@ -21,6 +21,7 @@ class EmailVerificationTokenAdmin(admin.ModelAdmin):
     list_filter = ["is_used", "created_at", "expires_at"]
     search_fields = ["user__email", "user__username"]
     readonly_fields = ["token", "created_at"]
+    list_select_related = ["user"]
 
     def has_add_permission(self, request):
         return False
@@ -32,6 +33,7 @@ class PasswordResetTokenAdmin(admin.ModelAdmin):
     list_filter = ["is_used", "created_at", "expires_at"]
     search_fields = ["user__email", "user__username", "ip_address"]
     readonly_fields = ["token", "created_at", "ip_address"]
+    list_select_related = ["user"]
 
     def has_add_permission(self, request):
         return False
@@ -43,6 +45,16 @@ class UserSessionAdmin(admin.ModelAdmin):
     list_filter = ["is_active", "created_at", "last_seen_at"]
     search_fields = ["user__email", "user__username", "device_name", "ip_address"]
     readonly_fields = ["refresh_token_jti", "user_agent", "created_at", "last_seen_at"]
+    list_select_related = ["user"]
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        # El changelist no muestra user_agent (TextField): no traerlo por cada fila.
+        # La vista de detalle sí lo muestra, así que ahí se carga completo.
+        match = request.resolver_match
+        if match is not None and match.url_name.endswith("_changelist"):
+            qs = qs.defer("user_agent")
+        return qs
 
     def has_add_permission(self, request):
         return False
@@ -0,0 +1,48 @@
+"""
+Autenticación JWT con cache de tokens ya validados.
+
+Cada request autenticado verifica la firma HMAC y decodifica el JSON del
+access token. Un cliente manda el mismo token en muchos requests seguidos,
+así que guardamos el token validado unos segundos (por proceso) y evitamos
+repetir el trabajo. Nunca se cachea más allá del `exp` del token.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication con LRU + TTL corto sobre get_validated_token()."""
+
+    cache_ttl_seconds = 15
+    cache_max_size = 10_000
+
+    _cache = OrderedDict()
+    _lock = threading.Lock()
+
+    def get_validated_token(self, raw_token):
+        now = time.time()
+
+        with self._lock:
+            entry = self._cache.get(raw_token)
+            if entry is not None:
+                validated_token, expires_at = entry
+                if expires_at > now:
+                    self._cache.move_to_end(raw_token)
+                    return validated_token
+                del self._cache[raw_token]
+
+        validated_token = super().get_validated_token(raw_token)
+
+        # TTL = min(exp - now, cache_ttl_seconds)
+        expires_at = min(validated_token.get("exp", now), now + self.cache_ttl_seconds)
+        if expires_at > now:
+            with self._lock:
+                self._cache[raw_token] = (validated_token, expires_at)
+                self._cache.move_to_end(raw_token)
+                if len(self._cache) > self.cache_max_size:
+                    self._cache.popitem(last=False)
+
+        return validated_token
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.models import EmailVerificationToken, PasswordResetToken
+
+
+class Command(BaseCommand):
+    help = "Delete expired email verification and password reset tokens in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Filas por DELETE (default: 10000)",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        cutoff = timezone.now()
+
+        for model in (EmailVerificationToken, PasswordResetToken):
+            deleted = 0
+            # Lotes acotados sobre el índice de expires_at: cada DELETE toma pocos locks
+            # y no compite con verificación/login como lo haría un DELETE de toda la tabla.
+            while ids := list(
+                model.objects.filter(expires_at__lt=cutoff).values_list("pk", flat=True)[:batch_size]
+            ):
+                model.objects.filter(pk__in=ids).delete()
+                deleted += len(ids)
+
+            self.stdout.write(
+                self.style.SUCCESS(f"{model.__name__}: {deleted} expired tokens deleted.")
+            )
@@ -0,0 +1,49 @@
+"""
+Índices trigram (pg_trgm) sobre auth_user.email / auth_user.username.
+
+Los admins de tokens y sesiones buscan con `user__email` / `user__username`,
+que Django traduce a `UPPER(col::text) LIKE UPPER('%q%')`. Un btree no sirve
+para ese patrón; un GIN con gin_trgm_ops sobre `upper(col)` sí.
+
+Solo aplica en PostgreSQL (SQLite de desarrollo se salta la migración).
+"""
+from django.db import migrations
+
+
+TRGM_INDEXES = [
+    ("auth_user_email_upper_trgm_idx", "email"),
+    ("auth_user_username_upper_trgm_idx", "username"),
+]
+
+
+def create_trgm_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+    for name, column in TRGM_INDEXES:
+        schema_editor.execute(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} "
+            f"ON auth_user USING gin (upper({column}) gin_trgm_ops);"
+        )
+
+
+def drop_trgm_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _ in TRGM_INDEXES:
+        schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name};")
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY no puede correr dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ("accounts", "0002_loginattempt_emailverificationtoken_and_more"),
+        ("auth", "0012_alter_user_first_name_max_length"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trgm_indexes, drop_trgm_indexes),
+    ]
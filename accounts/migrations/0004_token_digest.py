@@ -0,0 +1,41 @@
+"""
+Paso 1/2 del cambio de tokens a digest binario.
+
+Los tokens ya se guardaban como hex(SHA256(raw)); el digest binario es
+exactamente bytes.fromhex(hex), así que los tokens vigentes siguen siendo
+válidos tras la conversión.
+"""
+from django.db import migrations, models
+
+
+TOKEN_MODELS = ["EmailVerificationToken", "PasswordResetToken"]
+
+
+def hex_to_digest(apps, schema_editor):
+    for model_name in TOKEN_MODELS:
+        model = apps.get_model("accounts", model_name)
+        tokens = list(model.objects.only("pk", "token"))
+        for token in tokens:
+            token.token_digest = bytes.fromhex(token.token)
+        model.objects.bulk_update(tokens, ["token_digest"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_auth_user_trgm_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="emailverificationtoken",
+            name="token_digest",
+            field=models.BinaryField(max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name="passwordresettoken",
+            name="token_digest",
+            field=models.BinaryField(max_length=32, null=True),
+        ),
+        migrations.RunPython(hex_to_digest, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+"""
+Paso 2/2: reemplaza la columna hex (64 chars) por el digest binario (32 bytes).
+
+La columna hex se vuelve nullable antes de eliminarla para que la migración
+sea reversible: al revertir se recrea vacía y se rellena desde el digest.
+"""
+from django.db import migrations, models
+
+
+TOKEN_MODELS = ["EmailVerificationToken", "PasswordResetToken"]
+
+
+def digest_to_hex(apps, schema_editor):
+    for model_name in TOKEN_MODELS:
+        model = apps.get_model("accounts", model_name)
+        tokens = list(model.objects.only("pk", "token_digest"))
+        for token in tokens:
+            token.token = bytes(token.token_digest).hex()
+        model.objects.bulk_update(tokens, ["token"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0004_token_digest"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="emailverificationtoken",
+            name="token",
+            field=models.CharField(max_length=64, null=True),
+        ),
+        migrations.AlterField(
+            model_name="passwordresettoken",
+            name="token",
+            field=models.CharField(max_length=64, null=True),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, digest_to_hex),
+        migrations.RemoveField(
+            model_name="emailverificationtoken",
+            name="token",
+        ),
+        migrations.RemoveField(
+            model_name="passwordresettoken",
+            name="token",
+        ),
+        migrations.RenameField(
+            model_name="emailverificationtoken",
+            old_name="token_digest",
+            new_name="token",
+        ),
+        migrations.RenameField(
+            model_name="passwordresettoken",
+            old_name="token_digest",
+            new_name="token",
+        ),
+        migrations.AlterField(
+            model_name="emailverificationtoken",
+            name="token",
+            field=models.BinaryField(max_length=32, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="passwordresettoken",
+            name="token",
+            field=models.BinaryField(max_length=32, unique=True),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.11 on 2026-10-15 21:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0005_alter_token_binary"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="emailverificationtoken",
+            name="token",
+            field=models.BinaryField(max_length=32),
+        ),
+        migrations.AlterField(
+            model_name="passwordresettoken",
+            name="token",
+            field=models.BinaryField(max_length=32),
+        ),
+        migrations.AddConstraint(
+            model_name="emailverificationtoken",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("is_used", False)),
+                fields=("token",),
+                name="evt_token_active_uq",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="passwordresettoken",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("is_used", False)),
+                fields=("token",),
+                name="prt_token_active_uq",
+            ),
+        ),
+    ]
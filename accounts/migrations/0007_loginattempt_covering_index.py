@@ -0,0 +1,31 @@
+# Generated by Django 5.2.11 on 2026-10-15 21:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0006_token_partial_unique"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="loginattempt",
+            name="identifier",
+            field=models.CharField(max_length=255),
+        ),
+        migrations.AlterField(
+            model_name="loginattempt",
+            name="locked_until",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="loginattempt",
+            index=models.Index(
+                fields=["identifier", "locked_until"],
+                include=("attempts",),
+                name="la_ident_locked_cov",
+            ),
+        ),
+    ]
@@ -0,0 +1,42 @@
+"""
+Índice btree sobre auth_user.email.
+
+Registro (validate() del RegisterSerializer), reenvío de verificación y
+solicitud de reset buscan por igualdad exacta de email. Los emails se guardan
+ya normalizados (lower/strip en el serializer), así que un btree simple basta;
+auth_user no trae índice propio sobre email.
+
+Solo aplica en PostgreSQL (SQLite de desarrollo se salta la migración).
+"""
+from django.db import migrations
+
+
+INDEX_NAME = "auth_user_email_idx"
+
+
+def create_email_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} ON auth_user (email);"
+    )
+
+
+def drop_email_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME};")
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY no puede correr dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ("accounts", "0007_loginattempt_covering_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_email_index, drop_email_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.11 on 2026-10-15 21:54
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0008_auth_user_email_index"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="usersession",
+            name="last_seen_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
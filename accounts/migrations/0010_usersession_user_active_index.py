@@ -0,0 +1,26 @@
+# Generated by Django 5.2.11 on 2026-10-15 21:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0009_usersession_last_seen_default"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="usersession",
+            name="is_active",
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddIndex(
+            model_name="usersession",
+            index=models.Index(
+                fields=["user", "is_active"], name="usersession_user_active_idx"
+            ),
+        ),
+    ]
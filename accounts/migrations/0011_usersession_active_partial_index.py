@@ -0,0 +1,27 @@
+# Generated by Django 5.2.11 on 2026-10-15 22:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0010_usersession_user_active_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="usersession",
+            name="usersession_user_active_idx",
+        ),
+        migrations.AddIndex(
+            model_name="usersession",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["user", "-last_seen_at"],
+                name="usersession_user_active_idx",
+            ),
+        ),
+    ]
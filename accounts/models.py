@@ -1,9 +1,12 @@
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import User
 from django.utils import timezone
 import secrets
 import hashlib
 
+_sha256 = hashlib.sha256
+
 
 class UserProfile(models.Model):
     """
@@ -23,10 +26,10 @@ class EmailVerificationToken(models.Model):
     Token one-time para verificación de email.
     - Expira en 24 horas
     - Se marca como usado después del primer uso
-    - Token hasheado en DB (SHA256)
+    - Token hasheado en DB (SHA256, 32 bytes binarios)
     """
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="email_verification_tokens")
-    token = models.CharField(max_length=64, unique=True, db_index=True)
+    token = models.BinaryField(max_length=32)
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField(db_index=True)
     is_used = models.BooleanField(default=False)
@@ -35,6 +38,12 @@ class EmailVerificationToken(models.Model):
         verbose_name = "Token de verificación de email"
         verbose_name_plural = "Tokens de verificación de email"
         ordering = ["-created_at"]
+        constraints = [
+            # Índice único parcial: solo los tokens sin usar, que son los únicos que se buscan
+            models.UniqueConstraint(
+                fields=["token"], condition=Q(is_used=False), name="evt_token_active_uq"
+            ),
+        ]
 
     def __str__(self):
         return f"EmailVerification for {self.user.email} ({'used' if self.is_used else 'active'})"
@@ -45,13 +54,18 @@ class EmailVerificationToken(models.Model):
 
     @staticmethod
     def generate_token():
-        """Genera un token seguro de 32 bytes (64 chars hex)."""
-        return secrets.token_hex(32)
+        """Genera un token seguro de 32 bytes (se codifica en hex solo para el email)."""
+        return secrets.token_bytes(32)
 
     @staticmethod
     def hash_token(raw_token):
-        """Hashea el token con SHA256 para almacenamiento."""
-        return hashlib.sha256(raw_token.encode()).hexdigest()
+        """
+        Hashea el token con SHA256 para almacenamiento (digest binario de 32 bytes).
+        Acepta el token en bytes o en hex (como llega desde el link del email).
+        """
+        if isinstance(raw_token, bytes):
+            raw_token = raw_token.hex()
+        return _sha256(raw_token.encode()).digest()
 
 
 class PasswordResetToken(models.Model):
@@ -59,11 +73,11 @@ class PasswordResetToken(models.Model):
     Token one-time para recuperación de contraseña.
     - Expira en 1 hora
     - Se marca como usado después del primer uso
-    - Token hasheado en DB (SHA256)
+    - Token hasheado en DB (SHA256, 32 bytes binarios)
     - Auditoría de IP para seguridad
     """
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="password_reset_tokens")
-    token = models.CharField(max_length=64, unique=True, db_index=True)
+    token = models.BinaryField(max_length=32)
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField(db_index=True)
     is_used = models.BooleanField(default=False)
@@ -73,6 +87,12 @@ class PasswordResetToken(models.Model):
         verbose_name = "Token de recuperación de contraseña"
         verbose_name_plural = "Tokens de recuperación de contraseña"
         ordering = ["-created_at"]
+        constraints = [
+            # Índice único parcial: solo los tokens sin usar, que son los únicos que se buscan
+            models.UniqueConstraint(
+                fields=["token"], condition=Q(is_used=False), name="prt_token_active_uq"
+            ),
+        ]
 
     def __str__(self):
         return f"PasswordReset for {self.user.email} ({'used' if self.is_used else 'active'})"
@@ -83,13 +103,18 @@ class PasswordResetToken(models.Model):
 
     @staticmethod
     def generate_token():
-        """Genera un token seguro de 32 bytes (64 chars hex)."""
-        return secrets.token_hex(32)
+        """Genera un token seguro de 32 bytes (se codifica en hex solo para el email)."""
+        return secrets.token_bytes(32)
 
     @staticmethod
     def hash_token(raw_token):
-        """Hashea el token con SHA256 para almacenamiento."""
-        return hashlib.sha256(raw_token.encode()).hexdigest()
+        """
+        Hashea el token con SHA256 para almacenamiento (digest binario de 32 bytes).
+        Acepta el token en bytes o en hex (como llega desde el link del email).
+        """
+        if isinstance(raw_token, bytes):
+            raw_token = raw_token.hex()
+        return _sha256(raw_token.encode()).digest()
 
 
 class UserSession(models.Model):
@@ -105,13 +130,24 @@ class UserSession(models.Model):
     user_agent = models.TextField(blank=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    last_seen_at = models.DateTimeField(auto_now=True)
-    is_active = models.BooleanField(default=True, db_index=True)
+    # Sin auto_now: cualquier save() (ej. revocar) no cuenta como actividad ni reescribe la columna
+    last_seen_at = models.DateTimeField(default=timezone.now)
+    is_active = models.BooleanField(default=True)
 
     class Meta:
         verbose_name = "Sesión de usuario"
         verbose_name_plural = "Sesiones de usuario"
         ordering = ["-last_seen_at"]
+        indexes = [
+            # "Sesiones activas del usuario" (listar, logout-all, reset): índice parcial solo
+            # sobre sesiones activas, ya ordenado como lo lista SessionListView.
+            # refresh_token_jti no necesita otro índice: su constraint unique ya lo es.
+            models.Index(
+                fields=["user", "-last_seen_at"],
+                condition=Q(is_active=True),
+                name="usersession_user_active_idx",
+            ),
+        ]
 
     def __str__(self):
         device = self.device_name or "Unknown device"
@@ -125,15 +161,23 @@ class LoginAttempt(models.Model):
     - locked_until: timestamp hasta cuando está bloqueado
     - Limpieza automática de registros antiguos recomendada vía cron/celery
     """
-    identifier = models.CharField(max_length=255, db_index=True)
+    identifier = models.CharField(max_length=255)
     attempts = models.PositiveIntegerField(default=0)
-    locked_until = models.DateTimeField(null=True, blank=True, db_index=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
     last_attempt = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = "Intento de login"
         verbose_name_plural = "Intentos de login"
         ordering = ["-last_attempt"]
+        indexes = [
+            # Covering index (PostgreSQL): el chequeo de rate limit es un index-only scan
+            models.Index(
+                fields=["identifier", "locked_until"],
+                include=["attempts"],
+                name="la_ident_locked_cov",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.identifier} - {self.attempts} attempts"
@@ -148,4 +192,4 @@ class LoginAttempt(models.Model):
         """Resetea el contador de intentos."""
         self.attempts = 0
         self.locked_until = None
-        self.save()
\ No newline at end of file
+        self.save(update_fields=["attempts", "locked_until", "last_attempt"])
\ No newline at end of file
@@ -1,6 +1,9 @@
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from rest_framework import serializers
 from .models import UserSession
 
@@ -10,17 +13,14 @@ class UserPublicSerializer(serializers.ModelSerializer):
     Para respuestas (ej: /me). Nunca incluye password.
     Incluye estado de verificación de email.
     """
-    is_email_verified = serializers.SerializerMethodField()
+    # is_active es el flag de verificación de email; se lee directo del modelo
+    is_email_verified = serializers.BooleanField(source="is_active", read_only=True)
 
     class Meta:
         model = User
         fields = ["id", "username", "email", "first_name", "last_name", "is_email_verified", "date_joined", "last_login"]
         read_only_fields = ["id", "date_joined", "last_login", "is_email_verified"]
 
-    def get_is_email_verified(self, obj):
-        """Verificamos si el usuario está activo (usaremos is_active como flag de verificación)."""
-        return obj.is_active
-
 
 class UserUpdateSerializer(serializers.ModelSerializer):
     """
@@ -37,6 +37,13 @@ class UserUpdateSerializer(serializers.ModelSerializer):
     def validate_last_name(self, value):
         return value.strip() if value else ""
 
+    def update(self, instance, validated_data):
+        """UPDATE de solo las columnas enviadas (sin save() completo ni señales)."""
+        if validated_data:
+            User.objects.filter(pk=instance.pk).update(**validated_data)
+            instance.refresh_from_db(fields=list(validated_data))
+        return instance
+
 
 class RegisterSerializer(serializers.ModelSerializer):
     """
@@ -48,34 +55,42 @@ class RegisterSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ["id", "username", "email", "first_name", "last_name", "password"]
+        # Sin UniqueValidator automático: la unicidad se valida en validate() con una sola query
+        extra_kwargs = {"username": {"validators": [UnicodeUsernameValidator()]}}
 
     def validate_username(self, value: str) -> str:
-        value = value.strip()
-        qs = User.objects.filter(username=value)
-
-        # Si en el futuro reutilizas este serializer para update, esto evita falso positivo
-        if self.instance is not None:
-            qs = qs.exclude(pk=self.instance.pk)
-
-        if qs.exists():
-            raise serializers.ValidationError("Este username ya está en uso.")
-        return value
+        return value.strip()
 
     def validate_email(self, value: str) -> str:
         value = value.lower().strip()
 
         if not value:
             raise serializers.ValidationError("El email es requerido.")
+        return value
 
-        qs = User.objects.filter(email=value)
+    def validate(self, attrs):
+        """
+        Unicidad de username y email en una sola query.
+        La constraint de la DB sigue siendo la garantía final (ver create()).
+        """
+        username = attrs.get("username")
+        email = attrs.get("email")
+
+        qs = User.objects.filter(Q(username=username) | Q(email=email))
 
         # Si en el futuro reutilizas este serializer para update, esto evita falso positivo
         if self.instance is not None:
             qs = qs.exclude(pk=self.instance.pk)
 
-        if qs.exists():
-            raise serializers.ValidationError("Este email ya está registrado.")
-        return value
+        errors = {}
+        for taken_username, taken_email in qs.values_list("username", "email")[:2]:
+            if taken_username == username:
+                errors["username"] = "Este username ya está en uso."
+            if taken_email == email:
+                errors["email"] = "Este email ya está registrado."
+        if errors:
+            raise serializers.ValidationError(errors)
+        return attrs
 
     def validate_password(self, value):
         """Usa los validadores de password de Django."""
@@ -86,8 +101,9 @@ class RegisterSerializer(serializers.ModelSerializer):
         return value
 
     def create(self, validated_data):
-        username = validated_data["username"].strip()
-        email = validated_data["email"].lower().strip()
+        # username y email ya vienen normalizados por validate_username/validate_email
+        username = validated_data["username"]
+        email = validated_data["email"]
 
         first_name = (validated_data.get("first_name") or "").strip()
         last_name = (validated_data.get("last_name") or "").strip()
@@ -95,14 +111,19 @@ class RegisterSerializer(serializers.ModelSerializer):
 
         # create_user => hashea password correctamente
         # is_active=False hasta que verifique el email
-        user = User.objects.create_user(
-            username=username,
-            email=email,
-            password=password,
-            first_name=first_name,
-            last_name=last_name,
-            is_active=False  # Requiere verificación de email
-        )
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user(
+                    username=username,
+                    email=email,
+                    password=password,
+                    first_name=first_name,
+                    last_name=last_name,
+                    is_active=False  # Requiere verificación de email
+                )
+        except IntegrityError:
+            # Carrera entre validate() y el INSERT: otro registro tomó el username
+            raise serializers.ValidationError({"username": ["Este username ya está en uso."]})
         return user
 
 
@@ -160,12 +181,8 @@ class UserSessionSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
     def get_is_current(self, obj):
-        """Determina si esta es la sesión actual del request."""
-        request = self.context.get("request")
-        if not request:
-            return False
-
-        # Obtener el JTI del token actual del request (si existe)
-        # Esto lo implementaremos en la view
-        current_jti = self.context.get("current_jti")
-        return obj.refresh_token_jti == current_jti if current_jti else False
+        """
+        Determina si esta es la sesión actual del request.
+        La view resuelve current_jti una sola vez; sin él (None) ninguna fila es la actual.
+        """
+        return obj.refresh_token_jti == self.context.get("current_jti")
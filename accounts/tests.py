@@ -2,11 +2,17 @@
 Tests para el sistema de autenticación mejorado.
 Cubre: registro, verificación email, login, password reset, sessions, rate limiting.
 """
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
+from django.core import mail
+from django.core.cache import cache
 from django.contrib.auth.models import User
 from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
 from datetime import timedelta
 
 from .models import (
@@ -22,6 +28,7 @@ class AuthenticationFlowTests(TestCase):
     """Tests del flujo completo de autenticación."""
 
     def setUp(self):
+        cache.clear()  # rate limiting vive en cache
         self.client = APIClient()
         self.register_url = "/api/v1/auth/register/"
         self.verify_url = "/api/v1/auth/verify-email/"
@@ -54,6 +61,46 @@ class AuthenticationFlowTests(TestCase):
             EmailVerificationToken.objects.filter(user=user).exists()
         )
 
+    def test_register_sends_verification_email_after_commit(self):
+        """Test: El email de verificación se envía al hacer commit, no dentro de la transacción."""
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self.client.post(
+                self.register_url,
+                {
+                    "username": "testuser",
+                    "email": "test@example.com",
+                    "password": "SecurePass123!",
+                },
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(mail.outbox), 0)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["test@example.com"])
+
+    def test_register_duplicate_username_and_email_fails(self):
+        """Test: Registro con username y email existentes devuelve 400 por campo."""
+        User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="SecurePass123!",
+        )
+
+        response = self.client.post(
+            self.register_url,
+            {
+                "username": "testuser",
+                "email": "TEST@example.com",
+                "password": "SecurePass123!",
+            },
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("username", response.data)
+        self.assertIn("email", response.data)
+
     def test_login_without_verification_fails(self):
         """Test: Login sin verificar email devuelve 403."""
         # Crear usuario sin verificar
@@ -143,11 +190,28 @@ class AuthenticationFlowTests(TestCase):
         response = self.client.post(self.verify_url, {"token": raw_token})
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_verify_email_token_cannot_be_reused(self):
+        """Test: Un token ya usado no puede verificar de nuevo."""
+        user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="SecurePass123!",
+            is_active=False,
+        )
+        _, raw_token = create_email_verification_token(user)
+
+        response = self.client.post(self.verify_url, {"token": raw_token})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.post(self.verify_url, {"token": raw_token})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class PasswordResetFlowTests(TestCase):
     """Tests del flujo de recuperación de contraseña."""
 
     def setUp(self):
+        cache.clear()  # rate limiting vive en cache
         self.client = APIClient()
         self.reset_request_url = "/api/v1/auth/password-reset/request/"
         self.reset_confirm_url = "/api/v1/auth/password-reset/confirm/"
@@ -224,6 +288,7 @@ class SessionManagementTests(TestCase):
     """Tests de gestión de sesiones."""
 
     def setUp(self):
+        cache.clear()  # rate limiting vive en cache
         self.client = APIClient()
         self.login_url = "/api/v1/auth/login/"
         self.logout_url = "/api/v1/auth/logout/"
@@ -300,6 +365,13 @@ class SessionManagementTests(TestCase):
             0
         )
 
+        # Todos los refresh tokens quedan en blacklist
+        self.assertFalse(
+            OutstandingToken.objects.filter(
+                user=self.user, blacklistedtoken__isnull=True
+            ).exists()
+        )
+
     def test_list_active_sessions(self):
         """Test: Listar sesiones activas del usuario."""
         # Crear 2 sesiones
@@ -327,6 +399,7 @@ class RateLimitingTests(TestCase):
     """Tests de rate limiting en login."""
 
     def setUp(self):
+        cache.clear()  # rate limiting vive en cache
         self.client = APIClient()
         self.login_url = "/api/v1/auth/login/"
 
@@ -361,6 +434,10 @@ class RateLimitingTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
         self.assertIn("bloqueada temporalmente", response.data["error"])
 
+        # El bloqueo queda registrado para auditoría
+        attempt = LoginAttempt.objects.get(identifier="testuser")
+        self.assertTrue(attempt.is_locked())
+
     def test_successful_login_resets_attempts(self):
         """Test: Login exitoso resetea el contador de intentos."""
         # 2 intentos fallidos
@@ -384,11 +461,38 @@ class RateLimitingTests(TestCase):
         except LoginAttempt.DoesNotExist:
             pass
 
+    def test_unverified_user_with_correct_password_is_never_locked(self):
+        """Test: reintentos con la contraseña correcta de un usuario sin verificar => 403, nunca 429."""
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        for _ in range(7):
+            response = self.client.post(
+                self.login_url,
+                {"username": "testuser", "password": "SecurePass123!"}
+            )
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_first_login_after_verification_is_not_locked(self):
+        """Test: tras varios 403 por email sin verificar, el primer login ya verificado => 200."""
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        for _ in range(5):
+            self.client.post(
+                self.login_url,
+                {"username": "testuser", "password": "SecurePass123!"}
+            )
+
+        User.objects.filter(pk=self.user.pk).update(is_active=True)  # verificó el email
+        response = self.client.post(
+            self.login_url,
+            {"username": "testuser", "password": "SecurePass123!"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
 
 class UserProfileTests(TestCase):
     """Tests de actualización de perfil."""
 
     def setUp(self):
+        cache.clear()  # rate limiting vive en cache
         self.client = APIClient()
         self.login_url = "/api/v1/auth/login/"
         self.me_url = "/api/v1/auth/me/"
@@ -437,3 +541,24 @@ class UserProfileTests(TestCase):
         self.user.refresh_from_db()
         self.assertEqual(self.user.first_name, "John")
         self.assertEqual(self.user.last_name, "Doe")
+
+
+class PurgeTokensCommandTests(TestCase):
+    """Tests del comando purge_tokens."""
+
+    def test_purge_deletes_only_expired_tokens(self):
+        """Test: purge_tokens borra tokens expirados y conserva los vigentes."""
+        user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="SecurePass123!",
+        )
+        expired, _ = create_email_verification_token(user)
+        expired.expires_at = timezone.now() - timedelta(hours=1)
+        expired.save()
+        valid_reset, _ = create_password_reset_token(user)
+
+        call_command("purge_tokens", batch_size=1, stdout=StringIO())
+
+        self.assertFalse(EmailVerificationToken.objects.filter(pk=expired.pk).exists())
+        self.assertTrue(PasswordResetToken.objects.filter(pk=valid_reset.pk).exists())
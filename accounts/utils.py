@@ -1,16 +1,54 @@
 """
 Utilidades para el sistema de autenticación.
-Incluye: envío de emails, rate limiting, extracción de metadata del request.
+Incluye: envío de emails, rate limiting (cache), extracción de metadata del request.
 """
+from django.core.cache import cache, caches
+from django.core.cache.backends.redis import RedisCache
 from django.core.mail import send_mail
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
-from datetime import timedelta
-from .models import EmailVerificationToken, PasswordResetToken, LoginAttempt
+from functools import partial
+from datetime import datetime, timedelta, timezone as dt_timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken, BlacklistedToken
+from .models import EmailVerificationToken, PasswordResetToken, LoginAttempt, UserSession
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Textos de los emails: la parte fija se arma una sola vez al importar el módulo
+_VERIFICATION_SUBJECT = "Verifica tu email - Mexicapp"
+_VERIFICATION_MESSAGE = """
+Hola {username},
+
+Gracias por registrarte en Mexicapp. Por favor verifica tu email haciendo click en el siguiente enlace:
+
+{link}
+
+Este enlace expira en 24 horas.
+
+Si no te registraste en Mexicapp, ignora este email.
+
+Saludos,
+El equipo de Mexicapp
+""".strip().format
+
+_PASSWORD_RESET_SUBJECT = "Recuperación de contraseña - Mexicapp"
+_PASSWORD_RESET_MESSAGE = """
+Hola {username},
+
+Recibimos una solicitud para restablecer tu contraseña. Haz click en el siguiente enlace para continuar:
+
+{link}
+
+Este enlace expira en 1 hora.
+
+Si no solicitaste restablecer tu contraseña, ignora este email y tu contraseña permanecerá sin cambios.
+
+Saludos,
+El equipo de Mexicapp
+""".strip().format
+
 
 def get_client_ip(request):
     """
@@ -19,7 +57,7 @@ def get_client_ip(request):
     """
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
     if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0].strip()
+        ip = x_forwarded_for.partition(',')[0].strip()  # solo el primer hop, sin armar la lista
     else:
         ip = request.META.get('REMOTE_ADDR')
     return ip
@@ -30,101 +68,84 @@ def get_user_agent(request):
     return request.META.get('HTTP_USER_AGENT', '')[:500]  # Limit length
 
 
-def send_verification_email(user, raw_token):
-    """
-    Envía el email de verificación al usuario.
-    En producción, usar un template HTML profesional.
-    """
-    verification_link = f"{settings.FRONTEND_URL}/verify-email?token={raw_token}"
-
-    subject = "Verifica tu email - Mexicapp"
-    message = f"""
-Hola {user.username},
-
-Gracias por registrarte en Mexicapp. Por favor verifica tu email haciendo click en el siguiente enlace:
-
-{verification_link}
-
-Este enlace expira en 24 horas.
-
-Si no te registraste en Mexicapp, ignora este email.
-
-Saludos,
-El equipo de Mexicapp
-    """.strip()
-
+def _deliver_email(subject, message, recipient, kind):
+    """Envía el email por SMTP/backend configurado. Los errores se loguean, no se propagan."""
     try:
         send_mail(
             subject=subject,
             message=message,
             from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
+            recipient_list=[recipient],
             fail_silently=False,
         )
-        logger.info(f"Verification email sent to {user.email}")
-        return True
+        logger.info(f"{kind.capitalize()} email sent to {recipient}")
     except Exception as e:
-        logger.error(f"Failed to send verification email to {user.email}: {str(e)}")
-        return False
+        logger.error(f"Failed to send {kind} email to {recipient}: {str(e)}")
 
 
-def send_password_reset_email(user, raw_token):
+def _send_after_commit(subject, message, recipient, kind):
     """
-    Envía el email de recuperación de contraseña.
-    En producción, usar un template HTML profesional.
+    Programa el envío para después del commit de la transacción actual.
+    Así la transacción no queda abierta durante el RTT de SMTP, y si hace
+    rollback no se envía un link con un token que nunca se guardó.
+    Fuera de una transacción se envía de inmediato. Retorna True (email programado).
     """
-    reset_link = f"{settings.FRONTEND_URL}/password-reset/confirm?token={raw_token}"
+    transaction.on_commit(partial(_deliver_email, subject, message, recipient, kind))
+    return True
 
-    subject = "Recuperación de contraseña - Mexicapp"
-    message = f"""
-Hola {user.username},
 
-Recibimos una solicitud para restablecer tu contraseña. Haz click en el siguiente enlace para continuar:
+def send_verification_email(user, raw_token):
+    """
+    Envía el email de verificación al usuario.
+    En producción, usar un template HTML profesional.
+    """
+    verification_link = f"{settings.FRONTEND_URL}/verify-email?token={raw_token}"
 
-{reset_link}
+    message = _VERIFICATION_MESSAGE(username=user.username, link=verification_link)
 
-Este enlace expira en 1 hora.
+    return _send_after_commit(_VERIFICATION_SUBJECT, message, user.email, "verification")
 
-Si no solicitaste restablecer tu contraseña, ignora este email y tu contraseña permanecerá sin cambios.
 
-Saludos,
-El equipo de Mexicapp
-    """.strip()
+def send_password_reset_email(user, raw_token):
+    """
+    Envía el email de recuperación de contraseña.
+    En producción, usar un template HTML profesional.
+    """
+    reset_link = f"{settings.FRONTEND_URL}/password-reset/confirm?token={raw_token}"
 
-    try:
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            fail_silently=False,
-        )
-        logger.info(f"Password reset email sent to {user.email}")
-        return True
-    except Exception as e:
-        logger.error(f"Failed to send password reset email to {user.email}: {str(e)}")
-        return False
+    message = _PASSWORD_RESET_MESSAGE(username=user.username, link=reset_link)
 
+    return _send_after_commit(_PASSWORD_RESET_SUBJECT, message, user.email, "password reset")
 
-def create_email_verification_token(user):
+
+def create_email_verification_token(user, invalidate_prior=False):
     """
     Crea un token de verificación de email para el usuario.
+    Con invalidate_prior=True marca como usados los tokens vigentes anteriores (reenvío).
     Retorna (token_object, raw_token) para enviar por email.
     """
-    # Generar token raw
+    # Generar y hashear fuera de la transacción
     raw_token = EmailVerificationToken.generate_token()
-
-    # Hashear para almacenar
     hashed_token = EmailVerificationToken.hash_token(raw_token)
+    now = timezone.now()
+
+    with transaction.atomic():
+        if invalidate_prior:
+            EmailVerificationToken.objects.filter(
+                user=user,
+                is_used=False,
+                expires_at__gt=now
+            ).update(is_used=True)
+
+        # Crear el token en DB
+        token = EmailVerificationToken.objects.create(
+            user=user,
+            token=hashed_token,
+            expires_at=now + timedelta(hours=24)
+        )
 
-    # Crear el token en DB
-    token = EmailVerificationToken.objects.create(
-        user=user,
-        token=hashed_token,
-        expires_at=timezone.now() + timedelta(hours=24)
-    )
-
-    return token, raw_token
+    # El link del email lleva el token en hex
+    return token, raw_token.hex()
 
 
 def create_password_reset_token(user, ip_address=None):
@@ -132,33 +153,161 @@ def create_password_reset_token(user, ip_address=None):
     Crea un token de reset de password para el usuario.
     Retorna (token_object, raw_token) para enviar por email.
     """
-    # Invalidar tokens anteriores (opcional pero recomendado)
-    PasswordResetToken.objects.filter(
-        user=user,
-        is_used=False,
-        expires_at__gt=timezone.now()
-    ).update(is_used=True)
-
-    # Generar token raw
+    # Generar y hashear fuera de la transacción
     raw_token = PasswordResetToken.generate_token()
-
-    # Hashear para almacenar
     hashed_token = PasswordResetToken.hash_token(raw_token)
+    now = timezone.now()
+
+    with transaction.atomic():
+        # Invalidar tokens anteriores (opcional pero recomendado)
+        PasswordResetToken.objects.filter(
+            user=user,
+            is_used=False,
+            expires_at__gt=now
+        ).update(is_used=True)
+
+        # Crear el token en DB
+        token = PasswordResetToken.objects.create(
+            user=user,
+            token=hashed_token,
+            expires_at=now + timedelta(hours=1),
+            ip_address=ip_address
+        )
 
-    # Crear el token en DB
-    token = PasswordResetToken.objects.create(
-        user=user,
-        token=hashed_token,
-        expires_at=timezone.now() + timedelta(hours=1),
-        ip_address=ip_address
-    )
+    # El link del email lleva el token en hex
+    return token, raw_token.hex()
 
-    return token, raw_token
+
+class RateLimiter:
+    """
+    Rate limiting de login respaldado por el cache de Django (Redis en producción).
+    - Cada intento se consume ANTES de autenticar (hit), así requests paralelos no
+      pueden colarse entre el chequeo y el registro del fallo
+    - El contador de intentos vive en cache con TTL (ventana fija de 1 hora)
+    - El bloqueo también vive en cache (epoch en segundos), con TTL igual a la duración del bloqueo
+    - Con Redis, chequeo de bloqueo + incremento + bloqueo es un solo script Lua atómico (un RTT)
+    - LoginAttempt solo se escribe al bloquear (auditoría / admin), no en cada intento
+    """
+    window_seconds = 60 * 60
+
+    # KEYS: contador, bloqueo. ARGV: ventana, max_attempts, locked_until (epoch), duración bloqueo
+    # Retorna {intentos, locked_until}: intentos = -1 si ya estaba bloqueado; locked_until = 0 si no bloquea
+    HIT_LUA = """
+local locked = redis.call('GET', KEYS[2])
+if locked then return {-1, tonumber(locked)} end
+local n = redis.call('INCR', KEYS[1])
+if n == 1 then redis.call('EXPIRE', KEYS[1], ARGV[1]) end
+if n > tonumber(ARGV[2]) then
+    redis.call('SET', KEYS[2], ARGV[3], 'EX', ARGV[4])
+    return {n, tonumber(ARGV[3])}
+end
+return {n, 0}
+"""
+    _script = None
+
+    def __init__(self, max_attempts=5, lockout_duration_minutes=15):
+        self.max_attempts = max_attempts
+        self.lockout_duration = timedelta(minutes=lockout_duration_minutes)
+
+    @staticmethod
+    def _attempts_key(identifier):
+        return f"la:{identifier}"
+
+    @staticmethod
+    def _lock_key(identifier):
+        return f"la:lock:{identifier}"
+
+    @staticmethod
+    def _from_epoch(ts):
+        return datetime.fromtimestamp(ts, tz=dt_timezone.utc)
+
+    def _new_locked_until(self):
+        # Precisión de segundos: es lo que se guarda en cache
+        return (timezone.now() + self.lockout_duration).replace(microsecond=0)
+
+    def hit(self, identifier):
+        """
+        Consume un intento de login de forma atómica.
+        Retorna (is_allowed: bool, attempts_left: int, locked_until: datetime|None).
+        """
+        backend = caches["default"]
+        if isinstance(backend, RedisCache):
+            return self._hit_redis(backend, identifier)
+
+        locked_ts = cache.get(self._lock_key(identifier))
+        if locked_ts is not None:
+            return False, 0, self._from_epoch(locked_ts)
+
+        key = self._attempts_key(identifier)
+        if cache.add(key, 1, timeout=self.window_seconds):
+            attempts = 1
+        else:
+            try:
+                attempts = cache.incr(key)
+            except ValueError:
+                # La key expiró entre add() e incr()
+                cache.set(key, 1, timeout=self.window_seconds)
+                attempts = 1
+
+        if attempts > self.max_attempts:
+            locked_until = self._new_locked_until()
+            cache.set(
+                self._lock_key(identifier),
+                int(locked_until.timestamp()),
+                timeout=int(self.lockout_duration.total_seconds()),
+            )
+            self._audit_lock(identifier, attempts, locked_until)
+            return False, 0, locked_until
+        return True, self.max_attempts - attempts, None
+
+    def _hit_redis(self, backend, identifier):
+        attempts_key = backend.make_and_validate_key(self._attempts_key(identifier))
+        lock_key = backend.make_and_validate_key(self._lock_key(identifier))
+        # RedisCache no expone el cliente públicamente; _cache es su RedisCacheClient
+        client = backend._cache.get_client(attempts_key, write=True)
+        if RateLimiter._script is None:
+            RateLimiter._script = client.register_script(self.HIT_LUA)
+
+        new_locked_until = self._new_locked_until()
+        attempts, locked_ts = RateLimiter._script(
+            keys=[attempts_key, lock_key],
+            args=[
+                self.window_seconds,
+                self.max_attempts,
+                int(new_locked_until.timestamp()),
+                int(self.lockout_duration.total_seconds()),
+            ],
+            client=client,
+        )
+        if attempts == -1:
+            return False, 0, self._from_epoch(locked_ts)
+        if locked_ts:
+            self._audit_lock(identifier, attempts, new_locked_until)
+            return False, 0, new_locked_until
+        return True, self.max_attempts - attempts, None
+
+    @staticmethod
+    def _audit_lock(identifier, attempts, locked_until):
+        # UPDATE directo (sin SELECT previo ni save() de toda la fila); INSERT solo la primera vez
+        updated = LoginAttempt.objects.filter(identifier=identifier).update(
+            attempts=attempts,
+            locked_until=locked_until,
+            last_attempt=timezone.now(),
+        )
+        if not updated:
+            LoginAttempt.objects.create(
+                identifier=identifier, attempts=attempts, locked_until=locked_until
+            )
+
+    def reset(self, identifier):
+        """Limpia contador y bloqueo (cache) y el registro de auditoría si existe."""
+        cache.delete_many([self._attempts_key(identifier), self._lock_key(identifier)])
+        LoginAttempt.objects.filter(identifier=identifier).update(attempts=0, locked_until=None)
 
 
-def check_rate_limit(identifier, max_attempts=5, lockout_duration_minutes=15):
+def consume_login_attempt(identifier, max_attempts=5, lockout_duration_minutes=15):
     """
-    Verifica rate limiting para login.
+    Consume un intento de login antes de autenticar (rate limiting).
     Retorna (is_allowed: bool, attempts_left: int, locked_until: datetime|None)
 
     Args:
@@ -166,54 +315,32 @@ def check_rate_limit(identifier, max_attempts=5, lockout_duration_minutes=15):
         max_attempts: intentos máximos antes de bloqueo
         lockout_duration_minutes: minutos de bloqueo
     """
-    attempt, created = LoginAttempt.objects.get_or_create(
-        identifier=identifier,
-        defaults={'attempts': 0}
-    )
-
-    # Si está bloqueado, verificar si ya expiró
-    if attempt.is_locked():
-        return False, 0, attempt.locked_until
-
-    # Si pasó el tiempo de reset (ej: 1 hora sin intentos), resetear
-    if attempt.last_attempt and (timezone.now() - attempt.last_attempt) > timedelta(hours=1):
-        attempt.reset_attempts()
-        return True, max_attempts, None
+    return RateLimiter(max_attempts, lockout_duration_minutes).hit(identifier)
 
-    # Verificar si hay intentos disponibles
-    attempts_left = max_attempts - attempt.attempts
-    if attempts_left > 0:
-        return True, attempts_left, None
 
-    # Sin intentos, bloquear
-    attempt.locked_until = timezone.now() + timedelta(minutes=lockout_duration_minutes)
-    attempt.save()
-
-    return False, 0, attempt.locked_until
-
-
-def record_failed_login(identifier):
+def reset_login_attempts(identifier):
     """
-    Registra un intento fallido de login.
+    Resetea los intentos de login después de un login exitoso.
     """
-    attempt, created = LoginAttempt.objects.get_or_create(
-        identifier=identifier,
-        defaults={'attempts': 0}
-    )
+    RateLimiter().reset(identifier)
+    logger.info(f"Login attempts reset for {identifier}")
 
-    attempt.attempts += 1
-    attempt.save()
 
-    logger.warning(f"Failed login attempt for {identifier} (attempt {attempt.attempts})")
-
-
-def reset_login_attempts(identifier):
+def revoke_all(user):
     """
-    Resetea los intentos de login después de un login exitoso.
+    Invalida todas las sesiones del usuario y blacklistea sus refresh tokens.
+    Un UPDATE para las sesiones y un bulk INSERT para la blacklist (sin .save() por fila).
+    Retorna el número de sesiones invalidadas.
     """
-    try:
-        attempt = LoginAttempt.objects.get(identifier=identifier)
-        attempt.reset_attempts()
-        logger.info(f"Login attempts reset for {identifier}")
-    except LoginAttempt.DoesNotExist:
-        pass
+    revoked = UserSession.objects.filter(user=user, is_active=True).update(is_active=False)
+
+    # Solo los outstanding que aún no están en blacklist
+    outstanding_ids = OutstandingToken.objects.filter(
+        user=user, blacklistedtoken__isnull=True
+    ).values_list("id", flat=True)
+    BlacklistedToken.objects.bulk_create(
+        [BlacklistedToken(token_id=token_id) for token_id in outstanding_ids],
+        ignore_conflicts=True,
+        batch_size=500,  # acota el tamaño de cada INSERT si el usuario acumula muchos tokens
+    )
+    return revoked
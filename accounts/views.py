@@ -1,6 +1,4 @@
 from django.contrib.auth.models import User
-from django.contrib.auth import authenticate
-from django.utils import timezone
 from django.db import transaction
 from rest_framework import generics, status, views
 from rest_framework.permissions import AllowAny, IsAuthenticated
@@ -28,9 +26,9 @@ from .utils import (
     send_password_reset_email,
     create_email_verification_token,
     create_password_reset_token,
-    check_rate_limit,
-    record_failed_login,
+    consume_login_attempt,
     reset_login_attempts,
+    revoke_all,
 )
 import logging
 
@@ -109,7 +107,11 @@ class VerifyEmailView(views.APIView):
         hashed_token = EmailVerificationToken.hash_token(raw_token)
 
         try:
-            token = EmailVerificationToken.objects.get(token=hashed_token)
+            # is_used=False para que la búsqueda use el índice único parcial;
+            # select_related trae al usuario en la misma query
+            token = EmailVerificationToken.objects.select_related("user").get(
+                token=hashed_token, is_used=False
+            )
         except EmailVerificationToken.DoesNotExist:
             return Response(
                 {"error": "Token inválido."},
@@ -122,14 +124,23 @@ class VerifyEmailView(views.APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Activar usuario
+        with transaction.atomic():
+            # Marcar token como usado. El filtro is_used=False hace que dos requests
+            # concurrentes con el mismo token no puedan consumirlo ambos.
+            claimed = EmailVerificationToken.objects.filter(
+                pk=token.pk, is_used=False
+            ).update(is_used=True)
+            if not claimed:
+                return Response(
+                    {"error": "Token expirado o ya usado."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            # Activar usuario (UPDATE directo, sin save() ni señales)
+            User.objects.filter(pk=token.user_id).update(is_active=True)
+
         user = token.user
         user.is_active = True
-        user.save()
-
-        # Marcar token como usado
-        token.is_used = True
-        token.save()
 
         logger.info(f"Email verified for user: {user.email}")
 
@@ -172,15 +183,8 @@ class ResendVerificationView(views.APIView):
                     status=status.HTTP_200_OK
                 )
 
-            # Invalidar tokens anteriores
-            EmailVerificationToken.objects.filter(
-                user=user,
-                is_used=False,
-                expires_at__gt=timezone.now()
-            ).update(is_used=True)
-
-            # Crear nuevo token
-            _, raw_token = create_email_verification_token(user)
+            # Invalidar tokens anteriores y crear nuevo token
+            _, raw_token = create_email_verification_token(user, invalidate_prior=True)
 
             # Enviar email
             send_verification_email(user, raw_token)
@@ -226,9 +230,10 @@ class CustomLoginView(views.APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Rate limiting por username (o por IP si prefieres)
+        # Rate limiting por username (o por IP si prefieres).
+        # El intento se consume antes de autenticar; un login exitoso lo resetea.
         identifier = username.lower()
-        is_allowed, _, locked_until = check_rate_limit(identifier)
+        is_allowed, attempts_left, locked_until = consume_login_attempt(identifier)
 
         if not is_allowed:
             logger.warning(f"Login rate limit exceeded for {identifier} (locked until {locked_until})")
@@ -240,39 +245,38 @@ class CustomLoginView(views.APIView):
                 status=status.HTTP_429_TOO_MANY_REQUESTS
             )
 
-        # Verificar si el usuario existe y si está inactivo (no verificado)
-        # Django's authenticate() retorna None para usuarios con is_active=False
-        # Por eso primero verificamos manualmente
-        try:
-            user_obj = User.objects.get(username=username)
-            if not user_obj.is_active:
-                logger.warning(f"Login attempt for unverified user: {user_obj.email}")
-                return Response(
-                    {
-                        "error": "Tu email no ha sido verificado. Revisa tu correo para verificar tu cuenta.",
-                        "email": user_obj.email,
-                    },
-                    status=status.HTTP_403_FORBIDDEN
-                )
-        except User.DoesNotExist:
-            pass
-
-        # Intentar autenticar
-        user = authenticate(request, username=username, password=password)
+        # Una sola query por login: el usuario se busca una vez y la contraseña se
+        # verifica aquí (authenticate() volvería a consultar al usuario).
+        # Fila completa: UserPublicSerializer la usa en la respuesta.
+        user = User.objects.filter(username=username).first()
 
         if user is None:
-            # Credenciales inválidas
-            record_failed_login(identifier)
-            logger.warning(f"Failed login attempt for {identifier}")
+            # Igualar el tiempo de respuesta con el de un usuario existente (hash de password)
+            User().set_password(password)
+        if user is None or not user.check_password(password):
+            # Credenciales inválidas (el intento ya quedó contado)
+            logger.warning(f"Failed login attempt for {identifier} ({attempts_left} attempts left)")
 
             return Response(
                 {"error": "Credenciales inválidas."},
                 status=status.HTTP_401_UNAUTHORIZED
             )
 
-        # Login exitoso - resetear intentos
+        # Contraseña correcta: el intento consumido no cuenta como fallido (también para
+        # usuarios sin verificar, que si no quedarían bloqueados al reintentar)
         reset_login_attempts(identifier)
 
+        # is_active=False => email no verificado (solo se revela con la contraseña correcta)
+        if not user.is_active:
+            logger.warning(f"Login attempt for unverified user: {user.email}")
+            return Response(
+                {
+                    "error": "Tu email no ha sido verificado. Revisa tu correo para verificar tu cuenta.",
+                    "email": user.email,
+                },
+                status=status.HTTP_403_FORBIDDEN
+            )
+
         # Generar tokens JWT
         refresh = RefreshToken.for_user(user)
         access_token = str(refresh.access_token)
@@ -367,19 +371,8 @@ class LogoutAllView(views.APIView):
     def post(self, request):
         user = request.user
 
-        # Invalidar todas las sesiones
-        UserSession.objects.filter(user=user, is_active=True).update(is_active=False)
-
-        # Blacklist todos los tokens outstanding del usuario
-        outstanding_tokens = OutstandingToken.objects.filter(user=user)
-
-        for outstanding in outstanding_tokens:
-            try:
-                # Verificar si ya está en blacklist
-                if not BlacklistedToken.objects.filter(token=outstanding).exists():
-                    BlacklistedToken.objects.create(token=outstanding)
-            except Exception:
-                pass
+        # Invalidar todas las sesiones y blacklist de todos los tokens outstanding
+        revoke_all(user)
 
         logger.info(f"All sessions logged out for user: {user.email}")
 
@@ -429,9 +422,14 @@ class PasswordResetRequestView(views.APIView):
         email = serializer.validated_data["email"]
         ip_address = get_client_ip(request)
 
-        try:
-            user = User.objects.get(email=email, is_active=True)
+        # Solo las columnas que usan el token y el email (sin hidratar el User completo)
+        user = (
+            User.objects.filter(email=email, is_active=True)
+            .only("id", "username", "email")
+            .first()
+        )
 
+        if user is not None:
             # Crear token de reset
             _, raw_token = create_password_reset_token(user, ip_address)
 
@@ -439,8 +437,7 @@ class PasswordResetRequestView(views.APIView):
             send_password_reset_email(user, raw_token)
 
             logger.info(f"Password reset requested for: {email}")
-
-        except User.DoesNotExist:
+        else:
             logger.warning(f"Password reset requested for non-existent/inactive email: {email}")
 
         # Siempre retornar OK (no revelar si existe el usuario)
@@ -474,7 +471,11 @@ class PasswordResetConfirmView(views.APIView):
         hashed_token = PasswordResetToken.hash_token(raw_token)
 
         try:
-            token = PasswordResetToken.objects.get(token=hashed_token)
+            # is_used=False para que la búsqueda use el índice único parcial;
+            # select_related trae al usuario en la misma query
+            token = PasswordResetToken.objects.select_related("user").get(
+                token=hashed_token, is_used=False
+            )
         except PasswordResetToken.DoesNotExist:
             return Response(
                 {"error": "Token inválido."},
@@ -487,26 +488,24 @@ class PasswordResetConfirmView(views.APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Actualizar contraseña
+        # Marcar token como usado primero: is_used=False evita que dos requests
+        # concurrentes con el mismo token cambien la contraseña
+        claimed = PasswordResetToken.objects.filter(
+            pk=token.pk, is_used=False
+        ).update(is_used=True)
+        if not claimed:
+            return Response(
+                {"error": "Token expirado o ya usado."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Actualizar contraseña (set_password hashea, así que sigue siendo un método del modelo)
         user = token.user
         user.set_password(new_password)
-        user.save()
-
-        # Marcar token como usado
-        token.is_used = True
-        token.save()
+        user.save(update_fields=["password"])
 
-        # Invalidar todas las sesiones del usuario (seguridad)
-        UserSession.objects.filter(user=user, is_active=True).update(is_active=False)
-
-        # Blacklist todos los tokens (opcional pero recomendado)
-        outstanding_tokens = OutstandingToken.objects.filter(user=user)
-        for outstanding in outstanding_tokens:
-            try:
-                if not BlacklistedToken.objects.filter(token=outstanding).exists():
-                    BlacklistedToken.objects.create(token=outstanding)
-            except Exception:
-                pass
+        # Invalidar todas las sesiones del usuario y blacklist de sus tokens (seguridad)
+        revoke_all(user)
 
         logger.info(f"Password reset confirmed for user: {user.email}")
 
@@ -529,9 +528,20 @@ class SessionListView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
+        # El serializer solo lee columnas de la sesión (nunca session.user): sin JOIN,
+        # y solo las columnas que serializa
         return UserSession.objects.filter(
             user=self.request.user,
             is_active=True
+        ).only(
+            "id",
+            "refresh_token_jti",
+            "device_name",
+            "user_agent",
+            "ip_address",
+            "created_at",
+            "last_seen_at",
+            "is_active",
         ).order_by("-last_seen_at")
 
     def get_serializer_context(self):
@@ -564,15 +574,18 @@ class SessionRevokeView(views.APIView):
 
             # Invalidar sesión
             session.is_active = False
-            session.save()
-
-            # Blacklist el token si existe
-            try:
-                outstanding = OutstandingToken.objects.get(jti=jti, user=request.user)
-                if not BlacklistedToken.objects.filter(token=outstanding).exists():
-                    BlacklistedToken.objects.create(token=outstanding)
-            except OutstandingToken.DoesNotExist:
-                pass
+            session.save(update_fields=["is_active"])
+
+            # Blacklist el token si existe (ON CONFLICT DO NOTHING si ya estaba)
+            BlacklistedToken.objects.bulk_create(
+                [
+                    BlacklistedToken(token_id=token_id)
+                    for token_id in OutstandingToken.objects.filter(
+                        jti=jti, user=request.user
+                    ).values_list("id", flat=True)
+                ],
+                ignore_conflicts=True,
+            )
 
             logger.info(f"Session revoked for user {request.user.email}: {jti}")
 
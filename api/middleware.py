@@ -0,0 +1,145 @@
+import itertools
+import logging
+import os
+import re
+import secrets
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .request_context import request_id_var
+
+logger = logging.getLogger(__name__)
+
+
+def get_request_id(request):
+    """Retorna el request_id asignado por RequestIDMiddleware ("" si no pasó por él)."""
+    return request.META.get("REQUEST_ID", "")
+
+
+class RequestIDMiddleware:
+    """
+    Asigna un request_id a cada request (se resuelve una sola vez, al inicio).
+    - Respeta el X-Request-ID entrante (ej. del proxy/load balancer) si es válido
+    - Si no viene o no es válido, genera uno nuevo: prefijo aleatorio por proceso
+      (12 bytes en hex) + contador de 32 bits en hex. 32 caracteres en total.
+    - Lo guarda en request.META["REQUEST_ID"] (leer con get_request_id) y lo devuelve
+      en el header X-Request-ID. Mientras corre el request también queda en
+      request_id_var, para los logs (ver RequestIDFilter)
+    - Soporta sync y async: bajo ASGI no fuerza un salto al thread pool por request
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    max_length = 128
+    # search() se detiene en el primer carácter inválido; no necesita un patrón anclado
+    _has_invalid_char = re.compile(r"[^A-Za-z0-9_\-]").search
+    _counter_limit = 2**32
+
+    # Estado por proceso (compartido entre instancias del middleware)
+    _prefix = None
+    _counter = None
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._is_async = iscoroutinefunction(get_response)
+        if self._is_async:
+            markcoroutinefunction(self)
+
+    @classmethod
+    def _new_prefix(cls):
+        cls._prefix = secrets.token_hex(12)
+        # itertools.count está en C: next() es atómico bajo el GIL
+        cls._counter = itertools.count()
+
+    @classmethod
+    def _generate(cls):
+        n = next(cls._counter)
+        if n >= cls._counter_limit:
+            # Rotar el prefijo antes de que el contador se salga de 8 dígitos hex
+            cls._new_prefix()
+            n = next(cls._counter)
+        return f"{cls._prefix}{n:08x}"
+
+    def _assign(self, request):
+        # META directo: request.headers normaliza el nombre del header en cada get()
+        request_id = request.META.get("HTTP_X_REQUEST_ID")
+        if (
+            not request_id
+            or len(request_id) > self.max_length
+            or self._has_invalid_char(request_id)
+        ):
+            request_id = self._generate()
+
+        request.META["REQUEST_ID"] = request_id
+        return request_id
+
+    def __call__(self, request):
+        if self._is_async:
+            return self.__acall__(request)
+        request_id = self._assign(request)
+        token = request_id_var.set(request_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_id_var.reset(token)
+        response["X-Request-ID"] = request_id
+        return response
+
+    async def __acall__(self, request):
+        request_id = self._assign(request)
+        token = request_id_var.set(request_id)
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_id_var.reset(token)
+        response["X-Request-ID"] = request_id
+        return response
+
+
+class TimingMiddleware:
+    """
+    Mide la latencia de cada request en un solo lugar (las views no cronometran).
+    - Devuelve la duración en el header X-Response-Time-ms
+    - Escribe una línea de access log con la view resuelta, método, status y latencia
+    - Va después de RequestIDMiddleware: el log sale con el request_id
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._is_async = iscoroutinefunction(get_response)
+        if self._is_async:
+            markcoroutinefunction(self)
+
+    def _finish(self, request, response, started_at):
+        elapsed_ms = round((time.perf_counter() - started_at) * 1000)
+        response["X-Response-Time-ms"] = str(elapsed_ms)
+        match = request.resolver_match
+        logger.info(
+            "request view=%s method=%s status=%s latency_ms=%s",
+            match.view_name if match else "-",
+            request.method,
+            response.status_code,
+            elapsed_ms,
+        )
+        return response
+
+    def __call__(self, request):
+        if self._is_async:
+            return self.__acall__(request)
+        started_at = time.perf_counter()
+        return self._finish(request, self.get_response(request), started_at)
+
+    async def __acall__(self, request):
+        started_at = time.perf_counter()
+        return self._finish(request, await self.get_response(request), started_at)
+
+
+RequestIDMiddleware._new_prefix()
+# Los workers forkeados después de cargar la app (gunicorn --preload) no deben
+# compartir prefijo con el padre
+os.register_at_fork(after_in_child=RequestIDMiddleware._new_prefix)
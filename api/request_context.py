@@ -0,0 +1,14 @@
+import logging
+from contextvars import ContextVar
+
+# request_id del request en curso. Lo fija RequestIDMiddleware; un ContextVar
+# (a diferencia de threading.local) también aísla requests concurrentes bajo asyncio.
+request_id_var = ContextVar("request_id", default="-")
+
+
+class RequestIDFilter(logging.Filter):
+    """Agrega record.request_id ("-" fuera de un request) para usarlo en el formatter."""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
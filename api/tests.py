@@ -1,3 +1,72 @@
-from django.test import TestCase
+import logging
 
-# Create your tests here.
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+
+from .middleware import RequestIDMiddleware, TimingMiddleware, get_request_id
+from .request_context import RequestIDFilter, request_id_var
+
+
+class RequestIDMiddlewareTests(TestCase):
+    """Tests del header X-Request-ID."""
+
+    def test_generates_request_id_when_missing(self):
+        """Test: Sin X-Request-ID entrante, la respuesta trae uno generado."""
+        response = self.client.get("/api/v1/auth/ping/")
+        self.assertTrue(response["X-Request-ID"])
+
+    def test_propagates_incoming_request_id(self):
+        """Test: El X-Request-ID entrante se devuelve tal cual."""
+        response = self.client.get("/api/v1/auth/ping/", HTTP_X_REQUEST_ID="abc-123")
+        self.assertEqual(response["X-Request-ID"], "abc-123")
+
+    def test_replaces_invalid_request_id(self):
+        """Test: Un X-Request-ID con caracteres inválidos se reemplaza."""
+        response = self.client.get("/api/v1/auth/ping/", HTTP_X_REQUEST_ID="bad id\r\n")
+        self.assertNotEqual(response["X-Request-ID"], "bad id\r\n")
+        self.assertEqual(len(response["X-Request-ID"]), 32)
+
+    def test_get_request_id_reads_assigned_id(self):
+        """Test: get_request_id devuelve el id asignado por el middleware."""
+        response = self.client.get("/api/v1/auth/ping/", HTTP_X_REQUEST_ID="abc-123")
+        self.assertEqual(get_request_id(response.wsgi_request), "abc-123")
+
+    async def test_async_request_gets_request_id(self):
+        """Test: Bajo ASGI (AsyncClient) el middleware también asigna el header."""
+        response = await self.async_client.get(
+            "/api/v1/auth/ping/", headers={"X-Request-ID": "abc-123"}
+        )
+        self.assertEqual(response["X-Request-ID"], "abc-123")
+
+    def test_request_id_var_is_set_during_request_only(self):
+        """Test: request_id_var tiene el id mientras corre la view y se restaura al salir."""
+        seen = []
+
+        def view(request):
+            seen.append(request_id_var.get())
+            return HttpResponse()
+
+        RequestIDMiddleware(view)(RequestFactory().get("/", HTTP_X_REQUEST_ID="abc-123"))
+        self.assertEqual(seen, ["abc-123"])
+        self.assertEqual(request_id_var.get(), "-")
+
+    def test_filter_adds_request_id_to_log_record(self):
+        """Test: RequestIDFilter agrega request_id al record de logging."""
+        record = logging.LogRecord("test", logging.INFO, __file__, 1, "msg", None, None)
+        token = request_id_var.set("abc-123")
+        try:
+            self.assertTrue(RequestIDFilter().filter(record))
+        finally:
+            request_id_var.reset(token)
+        self.assertEqual(record.request_id, "abc-123")
+
+
+class TimingMiddlewareTests(TestCase):
+    def test_sets_response_time_header_and_logs(self):
+        """Test: X-Response-Time-ms en la respuesta + línea de access log."""
+        with self.assertLogs("api.middleware", level="INFO") as logs:
+            response = TimingMiddleware(lambda request: HttpResponse(status=204))(
+                RequestFactory().get("/")
+            )
+        self.assertTrue(response["X-Response-Time-ms"].isdigit())
+        self.assertIn("method=GET status=204", logs.output[0])
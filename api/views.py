@@ -1,9 +1,16 @@
-from django.http import JsonResponse
+import json
 
-def LocationsView(request):
-    data = [
+from django.http import HttpResponse
+
+# Payload estático: se serializa una sola vez al importar el módulo
+_LOCATIONS_JSON = json.dumps(
+    [
         {"id": 1, "name": "Ciudad de México", "country": "México"},
         {"id": 2, "name": "Guadalajara", "country": "México"},
         {"id": 3, "name": "Monterrey", "country": "México"},
     ]
-    return JsonResponse(data, safe=False)
+).encode()
+
+
+def LocationsView(request):
+    return HttpResponse(_LOCATIONS_JSON, content_type="application/json")
@@ -1,4 +1,6 @@
 from pathlib import Path
+import re
+import sys
 from decouple import config, Csv
 from datetime import timedelta
 import dj_database_url
@@ -36,7 +38,6 @@ INSTALLED_APPS = [
     'corsheaders',
     'rest_framework',
     'rest_framework_simplejwt.token_blacklist',
-    'rest_framework.authtoken',
     
     # Local Apps
     'accounts',
@@ -44,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.middleware.RequestIDMiddleware",
+    "api.middleware.TimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -83,6 +86,8 @@ if DATABASE_URL:
         "default": dj_database_url.parse(
             DATABASE_URL,
             conn_max_age=600,
+            # Descarta conexiones persistentes que el servidor cerró antes de reutilizarlas
+            conn_health_checks=True,
             ssl_require=config("DATABASE_SSL_REQUIRE", default=True, cast=bool),
         )
     }
@@ -95,6 +100,26 @@ else:
     }
 
 
+# Cache
+# Redis en producción (el rate limiting de login se comparte entre workers).
+# Sin REDIS_URL se usa locmem (desarrollo / tests, un contador por proceso).
+REDIS_URL = config("REDIS_URL", default=None)
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -113,6 +138,29 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# `manage.py test`: hasher barato. Los tests no dependen de la fuerza del hash y
+# PBKDF2 domina el costo de cada create_user/check_password
+TESTING = len(sys.argv) > 1 and sys.argv[1] == "test"
+if TESTING:
+    PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+
+class DisableMigrations:
+    """MIGRATION_MODULES que responde None para toda app: tablas directo desde los modelos."""
+
+    def __contains__(self, app_label):
+        return True
+
+    def __getitem__(self, app_label):
+        return None
+
+
+# Los tests crean el schema desde los modelos en vez de correr todas las migraciones.
+# Ninguna migración carga datos: las RunPython/RunSQL son índices solo-PostgreSQL o
+# conversiones de filas existentes. TEST_MIGRATIONS=True vuelve a correrlas.
+if TESTING and not config("TEST_MIGRATIONS", default=False, cast=bool):
+    MIGRATION_MODULES = DisableMigrations()
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/6.0/topics/i18n/
@@ -134,7 +182,7 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.AllowAny",
@@ -143,7 +191,13 @@ REST_FRAMEWORK = {
     "PAGE_SIZE": 10,
 }
 
+# Clave de firma resuelta una sola vez al cargar settings; SimpleJWT construye
+# su TokenBackend con este valor y lo reutiliza en cada emisión/refresh.
+JWT_SIGNING_KEY = config("JWT_SIGNING_KEY", default=SECRET_KEY)
+
 SIMPLE_JWT = {
+    "ALGORITHM": "HS256",
+    "SIGNING_KEY": JWT_SIGNING_KEY,
     "ACCESS_TOKEN_LIFETIME": timedelta(hours=1),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
     "ROTATE_REFRESH_TOKENS": True,
@@ -157,12 +211,17 @@ SIMPLE_JWT = {
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # Email Configuration
-# Para desarrollo: usa console backend (muestra emails en consola)
-# Para producción: configura SMTP via variables de entorno
+# Para desarrollo (DEBUG=True): console backend (muestra emails en consola)
+# Para producción: SMTP por defecto, configurado via variables de entorno.
+# El console backend escribe síncrono a stdout, que gunicorn captura por línea.
 
 EMAIL_BACKEND = config(
     "EMAIL_BACKEND",
-    default="django.core.mail.backends.console.EmailBackend"
+    default=(
+        "django.core.mail.backends.console.EmailBackend"
+        if DEBUG
+        else "django.core.mail.backends.smtp.EmailBackend"
+    ),
 )
 
 # Configuración SMTP (solo se usa si EMAIL_BACKEND es smtp.EmailBackend)
@@ -172,6 +231,8 @@ EMAIL_USE_TLS = config("EMAIL_USE_TLS", default=True, cast=bool)
 EMAIL_HOST_USER = config("EMAIL_HOST_USER", default="")
 EMAIL_HOST_PASSWORD = config("EMAIL_HOST_PASSWORD", default="")
 DEFAULT_FROM_EMAIL = config("DEFAULT_FROM_EMAIL", default="noreply@mexicapp.com")
+# Tope para conectar/enviar por SMTP: un servidor colgado no retiene al worker
+EMAIL_TIMEOUT = config("EMAIL_TIMEOUT", default=10, cast=int)
 
 # Frontend URL para links en emails (verificación, password reset)
 FRONTEND_URL = config("FRONTEND_URL", default="http://localhost:5173")
@@ -184,11 +245,16 @@ CORS_ALLOWED_ORIGINS = config(
 )
 CORS_ALLOW_CREDENTIALS = True
 
-CORS_ALLOWED_ORIGIN_REGEXES = config(
-    "CORS_ALLOWED_ORIGIN_REGEXES",
-    default=r"^https://scannivibe-frontend-.*\.vercel\.app$",
-    cast=Csv(),
-)
+# Compiladas una vez al cargar settings: corsheaders llama re.match() por request
+# y con un Pattern se salta la búsqueda en el cache interno de `re`.
+CORS_ALLOWED_ORIGIN_REGEXES = [
+    re.compile(pattern)
+    for pattern in config(
+        "CORS_ALLOWED_ORIGIN_REGEXES",
+        default=r"^https://scannivibe-frontend-.*\.vercel\.app$",
+        cast=Csv(),
+    )
+]
 
 CSRF_TRUSTED_ORIGINS = config(
     "CSRF_TRUSTED_ORIGINS",
@@ -203,9 +269,14 @@ USE_X_FORWARDED_HOST = True
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
+    "filters": {
+        "request_id": {
+            "()": "api.request_context.RequestIDFilter",
+        },
+    },
     "formatters": {
         "verbose": {
-            "format": "[{levelname}] {asctime} {module} {message}",
+            "format": "[{levelname}] {asctime} {request_id} {module} {message}",
             "style": "{",
         },
     },
@@ -213,6 +284,7 @@ LOGGING = {
         "console": {
             "class": "logging.StreamHandler",
             "formatter": "verbose",
+            "filters": ["request_id"],
         },
     },
     "root": {
@@ -230,5 +302,11 @@ LOGGING = {
             "level": "INFO",
             "propagate": False,
         },
+        # Access log de TimingMiddleware (una línea por request; silenciado en tests)
+        "api.middleware": {
+            "handlers": ["console"],
+            "level": "WARNING" if TESTING else "INFO",
+            "propagate": False,
+        },
     },
 }
@@ -12,10 +12,15 @@ class LocationAdmin(admin.ModelAdmin):
     list_filter = ("status", "city")
     search_fields = ("name", "qr_code")
     filter_horizontal = ("moods",) # Esto crea una interfaz genial para elegir vibes
+    # Orden solo en el admin: un Meta.ordering agregaría ORDER BY a todas las queries del modelo
+    ordering = ("-vibe_match_score",)
+    list_per_page = 50
+    show_full_result_count = False  # evita el COUNT(*) sin filtros en cada página filtrada
 
 @admin.register(Visit)
 class VisitAdmin(admin.ModelAdmin):
     list_display = ("user", "location", "status", "checked_in_at")
+    list_select_related = ("user", "location")
 
 admin.site.register(Collectible)
 admin.site.register(Favorite)
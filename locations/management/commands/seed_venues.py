@@ -1,6 +1,6 @@
-from decimal import Decimal
-
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
 
 from locations.models import Location, Mood
 
@@ -73,60 +73,106 @@ VENUES = [
 ]
 
 
+def _venue_defaults(index, venue):
+    """Valores de la Location para un venue (lo que se crea o se compara)."""
+    return {
+        "name": venue["name"],
+        "description": f"Popular {venue['cat']} in CDMX's {venue['addr'].split(',')[-1].strip()} neighborhood.",
+        "category": venue["cat"],
+        "status": Location.Status.APPROVED,
+        "city": "CDMX",
+        "address": venue["addr"],
+        "latitude": venue["lat"],
+        "longitude": venue["lng"],
+        "image_url": f"https://picsum.photos/seed/venue{index}/600/400",
+        "vibe_match_score": venue["score"],
+    }
+
+
+# (qr_code, defaults, mood slugs) por venue, armado una sola vez al importar
+_PREPARED = [
+    (f"VEN-{index:03d}", _venue_defaults(index, venue), venue["moods"])
+    for index, venue in enumerate(VENUES, start=1)
+]
+
+
 class Command(BaseCommand):
     help = "Seed 50 CDMX venues with moods"
 
+    @transaction.atomic
     def handle(self, *args, **options):
-        mood_objects = {}
+        # Moods: una query para leer, bulk para crear/actualizar
+        mood_objects = Mood.objects.in_bulk(
+            [mood["slug"] for mood in MOODS_DATA], field_name="slug"
+        )
+        moods_to_create = []
+        moods_to_update = []
         for mood in MOODS_DATA:
-            obj, _ = Mood.objects.get_or_create(
-                slug=mood["slug"],
-                defaults={"name": mood["name"], "is_active": True},
-            )
-            fields_to_update = []
-            if obj.name != mood["name"]:
+            obj = mood_objects.get(mood["slug"])
+            if obj is None:
+                moods_to_create.append(
+                    Mood(slug=mood["slug"], name=mood["name"], is_active=True)
+                )
+            elif obj.name != mood["name"] or not obj.is_active:
                 obj.name = mood["name"]
-                fields_to_update.append("name")
-            if not obj.is_active:
                 obj.is_active = True
-                fields_to_update.append("is_active")
-            if fields_to_update:
-                obj.save(update_fields=fields_to_update)
-            mood_objects[mood["slug"]] = obj
-
-        created = 0
-        for index, venue in enumerate(VENUES, start=1):
-            defaults = {
-                "name": venue["name"],
-                "description": f"Popular {venue['cat']} in CDMX's {venue['addr'].split(',')[-1].strip()} neighborhood.",
-                "category": venue["cat"],
-                "status": Location.Status.APPROVED,
-                "city": "CDMX",
-                "address": venue["addr"],
-                "latitude": Decimal(str(venue["lat"])),
-                "longitude": Decimal(str(venue["lng"])),
-                "image_url": f"https://picsum.photos/seed/venue{index}/600/400",
-                "vibe_match_score": venue["score"],
-            }
-
-            location, was_created = Location.objects.get_or_create(
-                qr_code=f"VEN-{index:03d}",
-                defaults=defaults,
-            )
+                moods_to_update.append(obj)
+        for obj in Mood.objects.bulk_create(moods_to_create):
+            mood_objects[obj.slug] = obj
+        Mood.objects.bulk_update(moods_to_update, ["name", "is_active"])
+
+        # Venues: una query para leer los existentes por qr_code
+        existing = Location.objects.in_bulk(
+            [qr_code for qr_code, _, _ in _PREPARED], field_name="qr_code"
+        )
+        now = timezone.now()
+        to_create = []
+        to_update = []
+        update_fields = set()
+        for qr_code, defaults, _ in _PREPARED:
+            location = existing.get(qr_code)
+            if location is None:
+                to_create.append(Location(qr_code=qr_code, **defaults))
+                continue
 
-            if not was_created:
-                update_fields = []
-                for field_name, value in defaults.items():
-                    if getattr(location, field_name) != value:
-                        setattr(location, field_name, value)
-                        update_fields.append(field_name)
-                if update_fields:
-                    location.save(update_fields=update_fields)
-            else:
-                created += 1
+            changed = [
+                field_name
+                for field_name, value in defaults.items()
+                if getattr(location, field_name) != value
+            ]
+            if changed:
+                for field_name in changed:
+                    setattr(location, field_name, defaults[field_name])
+                update_fields.update(changed)
+                # bulk_update no aplica auto_now
+                location.updated_at = now
+                to_update.append(location)
 
-            location.moods.set([mood_objects[slug] for slug in venue["moods"]])
+        created_locations = Location.objects.bulk_create(to_create, batch_size=200)
+        if to_update:
+            Location.objects.bulk_update(
+                to_update, sorted(update_fields | {"updated_at"}), batch_size=200
+            )
+
+        # M2M: reemplazar todas las filas de la tabla intermedia en dos queries
+        locations_by_qr = {**existing, **{loc.qr_code: loc for loc in created_locations}}
+        Through = Location.moods.through
+        Through.objects.filter(
+            location_id__in=[loc.pk for loc in locations_by_qr.values()]
+        ).delete()
+        Through.objects.bulk_create(
+            [
+                Through(
+                    location_id=locations_by_qr[qr_code].pk,
+                    mood_id=mood_objects[slug].pk,
+                )
+                for qr_code, _, mood_slugs in _PREPARED
+                for slug in mood_slugs
+            ],
+            batch_size=500,
+        )
 
+        created = len(created_locations)
         total_seeded = Location.objects.filter(qr_code__startswith="VEN-").count()
         self.stdout.write(
             self.style.SUCCESS(
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.11 on 2026-10-15 22:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("locations", "0004_review"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="location",
+            index=models.Index(
+                fields=["status", "-created_at"], name="location_status_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="location",
+            index=models.Index(
+                fields=["category", "status"], name="location_category_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="visit",
+            index=models.Index(fields=["user", "status"], name="visit_user_status_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="visit",
+            index=models.Index(fields=["checked_in_at"], name="visit_checked_in_idx"),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.11 on 2026-10-15 22:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("locations", "0006_location_float_coordinates"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="visit",
+            index=models.Index(
+                fields=["checked_in_at", "location"], name="visit_checked_in_loc_idx"
+            ),
+        ),
+        # Se borra después de crear el nuevo: el rango por fecha nunca queda sin índice
+        migrations.RemoveIndex(
+            model_name="visit",
+            name="visit_checked_in_idx",
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.11 on 2026-10-15 22:34
+
+from django.db import migrations, models
+
+
+def unpublish_locations_without_coords(apps, schema_editor):
+    # Aprobadas sin coordenadas vuelven a pendiente para que la constraint se pueda crear
+    Location = apps.get_model("locations", "Location")
+    Location.objects.filter(status="approved").filter(
+        models.Q(latitude__isnull=True) | models.Q(longitude__isnull=True)
+    ).update(status="pending")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("locations", "0007_visit_checked_in_location_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            unpublish_locations_without_coords, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name="location",
+            constraint=models.CheckConstraint(
+                condition=models.Q(
+                    models.Q(("status", "approved"), _negated=True),
+                    models.Q(("latitude__isnull", False), ("longitude__isnull", False)),
+                    _connector="OR",
+                ),
+                name="location_approved_has_coords",
+                violation_error_message="Una location aprobada requiere latitud y longitud.",
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.11 on 2026-10-15 22:37
+
+import django.db.models.functions.datetime
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("locations", "0008_location_approved_has_coords"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="visit",
+            index=models.Index(
+                django.db.models.functions.datetime.TruncDay("checked_in_at"),
+                models.F("location"),
+                name="visit_day_loc_idx",
+            ),
+        ),
+    ]
@@ -1,5 +1,6 @@
 # locations/models.py
 from django.db import models
+from django.db.models.functions import TruncDay
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 
@@ -39,9 +40,13 @@ class Location(models.Model):
 
     city = models.CharField(max_length=100, default="Santiago")
     address = models.CharField(max_length=255, blank=True)
-    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
-    longitude = models.DecimalField(
-        max_digits=9, decimal_places=6, null=True, blank=True
+    # float (double precision) en lugar de NUMERIC: más barato en Python y en la DB,
+    # y de sobra preciso para coordenadas
+    latitude = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)]
+    )
+    longitude = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)]
     )
 
     qr_code = models.CharField(
@@ -61,6 +66,22 @@ class Location(models.Model):
     class Meta:
         verbose_name = "Lugar"
         verbose_name_plural = "Lugares"
+        indexes = [
+            # Listado público: aprobados, más recientes primero
+            models.Index(fields=["status", "-created_at"], name="location_status_created_idx"),
+            # Heatmap: filtro por categoría sobre locations aprobadas
+            models.Index(fields=["category", "status"], name="location_category_status_idx"),
+        ]
+        constraints = [
+            # Una location publicada siempre tiene coordenadas: el heatmap (y el mapa)
+            # no necesitan filtrar lat/lng nulos en cada query
+            models.CheckConstraint(
+                condition=~models.Q(status="approved")
+                | models.Q(latitude__isnull=False, longitude__isnull=False),
+                name="location_approved_has_coords",
+                violation_error_message="Una location aprobada requiere latitud y longitud.",
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -83,6 +104,19 @@ class Visit(models.Model):
     class Meta:
         verbose_name = "Visita"
         verbose_name_plural = "Visitas"
+        indexes = [
+            # Vibe match: visitas COMPLETED del usuario
+            models.Index(fields=["user", "status"], name="visit_user_status_idx"),
+            # Heatmap: rango from/to sobre checked_in_at; location_id en el mismo índice
+            # cubre el GROUP BY por location sin volver a la tabla
+            models.Index(fields=["checked_in_at", "location"], name="visit_checked_in_loc_idx"),
+            # Heatmap sin rango: GROUP BY/ORDER BY (día, location) recorre el índice ya
+            # ordenado en vez de ordenar toda la tabla. Misma expresión que la view
+            # (TruncDay en la zona de TIME_ZONE)
+            models.Index(
+                TruncDay("checked_in_at"), models.F("location"), name="visit_day_loc_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.username} @ {self.location.name}"
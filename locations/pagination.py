@@ -0,0 +1,11 @@
+from rest_framework.pagination import LimitOffsetPagination
+
+
+class OptionalLimitOffsetPagination(LimitOffsetPagination):
+    """
+    Paginación opt-in para los listados "mis ...": sin ?limit= responde la lista
+    completa como antes (mismo contrato); con ?limit=&offset= pagina, con tope.
+    """
+
+    default_limit = None
+    max_limit = 100
@@ -1,7 +1,8 @@
-from urllib import request
+from django.db.models import Prefetch
 from rest_framework import serializers
+from rest_framework.fields import empty
 from .models import Mood, Location, Visit, Collectible, Favorite, Promotion
-from .utils import calculate_vibe_match 
+from .utils import calculate_vibe_match, get_visited_mood_ids
 
 class MoodSerializer(serializers.ModelSerializer):
     class Meta:
@@ -9,6 +10,14 @@ class MoodSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "slug")
 
 
+# Columnas de Location que lee LocationListSerializer (aparte de moods)
+LOCATION_LIST_COLUMNS = ("id", "name", "city", "image_url", "vibe_match_score")
+
+
+def _slim_moods():
+    return Mood.objects.only("id", "slug")
+
+
 class LocationListSerializer(serializers.ModelSerializer):
     moods = serializers.SlugRelatedField(many=True, read_only=True, slug_field="slug")
 
@@ -16,9 +25,34 @@ class LocationListSerializer(serializers.ModelSerializer):
         model = Location
         fields = ("id", "name", "city", "image_url", "moods", "vibe_match_score")
 
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """
+        Precarga lo que el serializer lee (evita N+1 sobre moods) y trae solo esas
+        columnas: description/address no viajan desde la DB en el listado.
+        """
+        return queryset.only(*LOCATION_LIST_COLUMNS).prefetch_related(
+            Prefetch("moods", queryset=_slim_moods())
+        )
+
+
+def embed_location_list(queryset, *columns):
+    """
+    Para serializers con LocationListSerializer embebido: location por JOIN, moods en
+    una query, y solo las columnas propias (`columns`) + las que lee el listado.
+    """
+    return (
+        queryset.select_related("location")
+        .only(*columns, "location", *(f"location__{name}" for name in LOCATION_LIST_COLUMNS))
+        .prefetch_related(Prefetch("location__moods", queryset=_slim_moods()))
+    )
+
 
 class LocationDetailSerializer(serializers.ModelSerializer):
     moods = MoodSerializer(many=True, read_only=True)
+    # Las columnas son float; se siguen exponiendo como decimal de 6 dígitos (string)
+    latitude = serializers.DecimalField(max_digits=9, decimal_places=6, read_only=True)
+    longitude = serializers.DecimalField(max_digits=9, decimal_places=6, read_only=True)
     vibe_match = serializers.SerializerMethodField(required=False)
 
     class Meta:
@@ -36,13 +70,33 @@ class LocationDetailSerializer(serializers.ModelSerializer):
             "vibe_match",
         )
 
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """Precarga lo que el serializer lee (evita N+1 sobre moods, solo las columnas de MoodSerializer)."""
+        return queryset.prefetch_related(
+            Prefetch("moods", queryset=Mood.objects.only(*MoodSerializer.Meta.fields))
+        )
+
     def get_vibe_match(self, obj):
-        request = self.context.get("request")
-        if request and request.user and request.user.is_authenticated:
-            return calculate_vibe_match(request.user, obj)
+        # Anónimos: sin vibe match. Para usuarios autenticados la view usa
+        # LocationDetailVibeSerializer, así este camino no evalúa request.user
         return None
 
 
+class LocationDetailVibeSerializer(LocationDetailSerializer):
+    """Detalle para usuarios autenticados: calcula vibe_match contra su historial."""
+
+    def get_vibe_match(self, obj):
+        # Los moods visitados por el usuario se calculan una vez por serialización
+        # (el context se comparte entre las filas si se usa con many=True)
+        user = self.context["request"].user
+        visited_mood_ids = self.context.get("_visited_mood_ids")
+        if visited_mood_ids is None:
+            visited_mood_ids = get_visited_mood_ids(user)
+            self.context["_visited_mood_ids"] = visited_mood_ids
+        return calculate_vibe_match(user, obj, visited_mood_ids)
+
+
 class VibeMatchSerializer(serializers.Serializer):
     vibe_match = serializers.IntegerField(default=50)
 
@@ -68,6 +122,11 @@ class VisitSerializer(serializers.ModelSerializer):
         model = Visit
         fields = ("id", "location", "status", "checked_in_at", "checked_out_at")
 
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """Location embebido (JOIN) y sus moods (una query para toda la página)."""
+        return embed_location_list(queryset, "id", "status", "checked_in_at", "checked_out_at")
+
 
 class CollectibleSerializer(serializers.ModelSerializer):
     location = LocationListSerializer(read_only=True)
@@ -76,6 +135,11 @@ class CollectibleSerializer(serializers.ModelSerializer):
         model = Collectible
         fields = ("id", "location", "awarded_at")
 
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """Location embebido (JOIN) y sus moods (una query para toda la página)."""
+        return embed_location_list(queryset, "id", "awarded_at")
+
 
 class FavoriteToggleSerializer(serializers.Serializer):
     location_id = serializers.IntegerField(min_value=1)
@@ -88,6 +152,11 @@ class FavoriteSerializer(serializers.ModelSerializer):
         model = Favorite
         fields = ("id", "location", "created_at")
 
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """Location embebido (JOIN) y sus moods (una query para toda la página)."""
+        return embed_location_list(queryset, "id", "created_at")
+
 
 class PromotionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -95,18 +164,44 @@ class PromotionSerializer(serializers.ModelSerializer):
         fields = ("id", "title", "is_active", "created_at")
 
 
+class CommaSeparatedListField(serializers.ListField):
+    """ListField que además separa por comas: ?category=bar,restaurant&category=other."""
+
+    def get_value(self, dictionary):
+        value = super().get_value(dictionary)
+        if value is empty:
+            return value
+        return [item.strip() for raw in value for item in str(raw).split(",") if item.strip()]
+
+
 class HeatmapFilterSerializer(serializers.Serializer):
-    from_datetime = serializers.DateTimeField(required=False)
-    to_datetime = serializers.DateTimeField(required=False)
-    source = serializers.ChoiceField(required=False, choices=("visits",))
+    """Recibe request.query_params directo (QueryDict), sin armar un dict intermedio."""
+
+    source = serializers.ChoiceField(
+        required=False, choices=("visits", "checkins"), default="visits"
+    )
     threshold = serializers.IntegerField(required=False, min_value=0, default=0)
     palette = serializers.ChoiceField(
         required=False, choices=("viridis", "cividis"), default="viridis"
     )
-    category = serializers.ListField(
+    category = CommaSeparatedListField(
         required=False,
         child=serializers.ChoiceField(choices=Location.Category.values),
     )
+    # Tamaño de celda en grados: agrupa los puntos en una grilla en SQL en vez de
+    # devolver uno por location
+    grid = serializers.FloatField(required=False, min_value=0.0001, max_value=1)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        # "from" es palabra reservada: no se puede declarar como atributo de clase
+        fields["from"] = serializers.DateTimeField(required=False, source="from_datetime")
+        fields["to"] = serializers.DateTimeField(required=False, source="to_datetime")
+        return fields
+
+    def validate_source(self, value):
+        # "checkins" es alias histórico de "visits"
+        return "visits"
 
     def validate(self, attrs):
         start = attrs.get("from_datetime")
@@ -1,19 +1,36 @@
+"""
+Tests de locations: listado/detalle, checkin/checkout, vibe match, heatmap y seed.
+Todas las clases usan TestCase/APITestCase (aislamiento por savepoint, sin TRUNCATE).
+Un test que necesite COMMIT real (ej. on_commit sin captureOnCommitCallbacks) va en un
+módulo aparte con TransactionTestCase, para no hacer lento el resto.
+"""
 from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Value, When
 from django.test import TestCase
 from django.contrib.auth.models import User
 from django.utils import timezone
-from rest_framework.test import APIClient
+from rest_framework.test import APITestCase
 from rest_framework import status
 
-from .models import Mood, Location, Visit, Collectible, Review
+from .models import Mood, Location, Visit, Collectible, Favorite, Review
+from .views import _parse_heatmap_filters
 
 
-class LocationsAPITests(TestCase):
-    def setUp(self):
-        self.client = APIClient()
+class LocationsAPITests(APITestCase):
+    # Rutas base (según tu urls actual)
+    locations_list_url = "/api/v1/locations/"
+    checkin_url = "/api/v1/visits/checkin/"
 
+    @classmethod
+    def setUpTestData(cls):
+        # Fixtures creados una vez por clase; cada test corre en un savepoint
         # Usuario principal
-        self.user = User.objects.create_user(
+        cls.user = User.objects.create_user(
             username="tester",
             email="test@vibe.com",
             password="pass12345",
@@ -21,7 +38,7 @@ class LocationsAPITests(TestCase):
         )
 
         # Otro usuario (para probar 403)
-        self.other_user = User.objects.create_user(
+        cls.other_user = User.objects.create_user(
             username="other",
             email="other@vibe.com",
             password="pass12345",
@@ -29,36 +46,101 @@ class LocationsAPITests(TestCase):
         )
 
         # Mood + Location aprobada con QR
-        self.mood = Mood.objects.create(
+        cls.mood = Mood.objects.create(
             name="Aventura", slug="aventura", is_active=True
         )
-        self.location = Location.objects.create(
+        cls.location = Location.objects.create(
             name="Test Bar",
             description="Lugar de prueba",
             city="Santiago",
             status=Location.Status.APPROVED,
+            latitude=-33.4372,
+            longitude=-70.6506,
             qr_code="QR123",
         )
-        self.location.moods.add(self.mood)
+        cls.location.moods.add(cls.mood)
+        cls.vibe_match_url = f"/api/v1/locations/{cls.location.id}/vibe-match/"
+
+    def setUp(self):
+        cache.clear()  # vibe match cacheado por (usuario, location)
+
+    def _checkout_url(self, visit):
+        return f"/api/v1/visits/{visit.id}/checkout/"
 
-        # Rutas base (según tu urls actual)
-        self.locations_list_url = "/api/v1/locations/"
-        self.checkin_url = "/api/v1/visits/checkin/"
+    def _checkin(self, qr_code="QR123"):
+        return self.client.post(self.checkin_url, {"qr_code": qr_code}, format="json")
 
     def test_locations_list_public_ok(self):
         """GET /locations/ debe ser público y devolver 200."""
         res = self.client.get(self.locations_list_url)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
+    def test_locations_list_filters_by_mood(self):
+        """GET /locations/?mood=slug: solo las locations con ese mood."""
+        Location.objects.create(
+            name="Sin mood",
+            status=Location.Status.APPROVED,
+            latitude=-33.44,
+            longitude=-70.65,
+            qr_code="QR-NOMOOD",
+        )
+        res = self.client.get(self.locations_list_url, {"mood": "aventura"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [row["id"] for row in res.data["results"]], [self.location.id]
+        )
+
+    def test_locations_list_loads_only_listed_columns(self):
+        """El listado no trae description de la DB y resuelve moods en una query."""
+        # COUNT de la paginación + página de locations + moods
+        with self.assertNumQueries(3) as ctx:
+            res = self.client.get(self.locations_list_url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["results"][0]["moods"], ["aventura"])
+        self.assertNotIn("description", ctx.captured_queries[1]["sql"])
+
+    def test_location_detail_vibe_match_only_for_authenticated(self):
+        """GET /locations/<id>/: vibe_match es null para anónimos y se calcula con sesión."""
+        url = f"{self.locations_list_url}{self.location.id}/"
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNone(res.data["vibe_match"])
+
+        self.client.force_authenticate(user=self.user)
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["vibe_match"], 70)
+
+    def test_location_detail_reuses_cached_visited_moods(self):
+        """Los moods visitados del usuario se cachean entre requests hasta el checkout."""
+        visit = Visit.objects.create(
+            user=self.user, location=self.location, status=Visit.Status.ACTIVE
+        )
+        self.client.force_authenticate(user=self.user)
+        url = f"{self.locations_list_url}{self.location.id}/"
+
+        self.assertEqual(self.client.get(url).data["vibe_match"], 70)
+        # Location + moods; el historial sale de cache
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(url).data["vibe_match"], 70)
+
+        scores = {"service_score": 5, "quality_score": 5, "price_score": 5, "vibe_score": 5}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self._checkout_url(visit), scores, format="json")
+        self.assertEqual(self.client.get(url).data["vibe_match"], 100)
+
     def test_checkin_requires_auth(self):
         """POST /visits/checkin/ sin auth => 401."""
-        res = self.client.post(self.checkin_url, {"qr_code": "QR123"}, format="json")
+        res = self._checkin()
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
     def test_checkin_creates_visit_and_collectible_first_time(self):
         """Primer checkin: crea visita ACTIVE y collectible_awarded=True."""
         self.client.force_authenticate(user=self.user)
-        res = self.client.post(self.checkin_url, {"qr_code": "QR123"}, format="json")
+        # Location + get_or_create del collectible + INSERT de la visita,
+        # más los SAVEPOINT/RELEASE del atomic y del get_or_create
+        with self.assertNumQueries(8):
+            res = self._checkin()
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
 
         self.assertIn("visit_id", res.data)
@@ -83,7 +165,7 @@ class LocationsAPITests(TestCase):
         Collectible.objects.create(user=self.user, location=self.location)
 
         self.client.force_authenticate(user=self.user)
-        res = self.client.post(self.checkin_url, {"qr_code": "QR123"}, format="json")
+        res = self._checkin()
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
         self.assertIn("collectible_awarded", res.data)
         self.assertFalse(res.data["collectible_awarded"])
@@ -97,9 +179,7 @@ class LocationsAPITests(TestCase):
     def test_checkin_invalid_qr_returns_404(self):
         """QR inválido => 404."""
         self.client.force_authenticate(user=self.user)
-        res = self.client.post(
-            self.checkin_url, {"qr_code": "NO_EXISTE"}, format="json"
-        )
+        res = self._checkin("NO_EXISTE")
         self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
 
     def test_checkout_forbidden_for_other_user(self):
@@ -109,7 +189,7 @@ class LocationsAPITests(TestCase):
         )
 
         self.client.force_authenticate(user=self.other_user)
-        checkout_url = f"/api/v1/visits/{visit.id}/checkout/"
+        checkout_url = self._checkout_url(visit)
         res = self.client.post(
             checkout_url,
             {"service_score": 5, "quality_score": 5, "price_score": 5, "vibe_score": 5},
@@ -124,7 +204,7 @@ class LocationsAPITests(TestCase):
         )
 
         self.client.force_authenticate(user=self.user)
-        checkout_url = f"/api/v1/visits/{visit.id}/checkout/"
+        checkout_url = self._checkout_url(visit)
         res = self.client.post(
             checkout_url,
             {
@@ -151,20 +231,138 @@ class LocationsAPITests(TestCase):
             ).exists()
         )
 
+    def test_checkout_already_reviewed_returns_409(self):
+        """Si la visita ya tiene Review, el checkout responde 409 sin duplicarla."""
+        visit = Visit.objects.create(
+            user=self.user, location=self.location, status=Visit.Status.ACTIVE
+        )
+        Review.objects.create(
+            user=self.user, location=self.location, visit=visit,
+            service_score=1, quality_score=1, price_score=1, vibe_score=1,
+        )
+
+        self.client.force_authenticate(user=self.user)
+        scores = {"service_score": 5, "quality_score": 5, "price_score": 5, "vibe_score": 5}
+        res = self.client.post(self._checkout_url(visit), scores, format="json")
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Review.objects.filter(visit=visit).count(), 1)
+        visit.refresh_from_db()
+        self.assertEqual(visit.status, Visit.Status.ACTIVE)
+
+    def test_vibe_match_is_cached_until_checkout(self):
+        """El vibe match se sirve de cache y el checkout lo invalida."""
+        visit = Visit.objects.create(
+            user=self.user, location=self.location, status=Visit.Status.ACTIVE
+        )
+        self.client.force_authenticate(user=self.user)
+        url = self.vibe_match_url
+
+        self.assertEqual(self.client.get(url).data["vibe_match"], 70)
+        # Segunda vez: solo la query del Location
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url).data["vibe_match"], 70)
+
+        scores = {"service_score": 5, "quality_score": 5, "price_score": 5, "vibe_score": 5}
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(self._checkout_url(visit), scores, format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.client.get(url).data["vibe_match"], 100)
+
     def test_vibe_match_endpoint_requires_auth(self):
         """GET /locations/<id>/vibe-match/ sin auth => 401"""
-        url = f"/api/v1/locations/{self.location.id}/vibe-match/"
+        url = self.vibe_match_url
         res = self.client.get(url)
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
     def test_vibe_match_no_history_returns_default_70(self):
         """Usuario autenticado sin visitas COMPLETED => 70."""
         self.client.force_authenticate(user=self.user)
-        url = f"/api/v1/locations/{self.location.id}/vibe-match/"
+        url = self.vibe_match_url
         res = self.client.get(url)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data["vibe_match"], 70)
 
+    def test_my_visits_query_count_does_not_grow_with_rows(self):
+        """GET /visits/me/: location por JOIN y moods en una query (sin N+1)."""
+        for i in range(3):
+            location = Location.objects.create(
+                name=f"Bar {i}",
+                status=Location.Status.APPROVED,
+                latitude=-33.44,
+                longitude=-70.65,
+                qr_code=f"QR-N1-{i}",
+            )
+            location.moods.add(self.mood)
+            Visit.objects.create(user=self.user, location=location)
+
+        self.client.force_authenticate(user=self.user)
+        with self.assertNumQueries(2):
+            res = self.client.get("/api/v1/visits/me/")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 3)
+        self.assertEqual(res.data[0]["location"]["moods"], ["aventura"])
+
+    def test_my_collectibles_and_favorites_query_count(self):
+        """Listados /me: location por JOIN + moods prefetcheados = 2 queries."""
+        Collectible.objects.create(user=self.user, location=self.location)
+        Favorite.objects.create(user=self.user, location=self.location)
+
+        self.client.force_authenticate(user=self.user)
+        for url in ("/api/v1/me/collectibles/", "/api/v1/favorites/me/"):
+            with self.subTest(url=url), self.assertNumQueries(2):
+                res = self.client.get(url)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                self.assertEqual(res.data[0]["location"]["moods"], [self.mood.slug])
+
+    def test_my_visits_optional_pagination_newest_first(self):
+        """GET /visits/me/?limit=: pagina (más recientes primero) con columnas acotadas."""
+        visits = [
+            Visit.objects.create(user=self.user, location=self.location)
+            for _ in range(3)
+        ]
+        self.client.force_authenticate(user=self.user)
+        # COUNT + página (location por JOIN) + moods
+        with self.assertNumQueries(3) as ctx:
+            res = self.client.get("/api/v1/visits/me/", {"limit": 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["count"], 3)
+        self.assertEqual(
+            [row["id"] for row in res.data["results"]],
+            [visits[2].id, visits[1].id],
+        )
+        self.assertNotIn("description", ctx.captured_queries[1]["sql"])
+
+    def test_favorite_toggle_removes_with_single_delete(self):
+        self.client.force_authenticate(user=self.user)
+        payload = {"location_id": self.location.id}
+        res = self.client.post("/api/v1/favorites/", payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        with self.assertNumQueries(1):
+            res = self.client.post("/api/v1/favorites/", payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(Favorite.objects.filter(user=self.user).exists())
+
+    def test_favorite_toggle_integrity_error_without_row_returns_404(self):
+        self.client.force_authenticate(user=self.user)
+        with mock.patch.object(
+            Favorite.objects, "create", side_effect=IntegrityError("fk")
+        ):
+            res = self.client.post(
+                "/api/v1/favorites/", {"location_id": self.location.id}, format="json"
+            )
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(Favorite.objects.filter(user=self.user).exists())
+
+    def test_favorite_delete_is_single_statement(self):
+        Favorite.objects.create(user=self.user, location=self.location)
+        self.client.force_authenticate(user=self.user)
+        with self.assertNumQueries(1):
+            res = self.client.delete(f"/api/v1/favorites/{self.location.id}/")
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Favorite.objects.filter(user=self.user).exists())
+
     def test_vibe_match_with_history_overlap_returns_gt_70(self):
         """Con historial COMPLETED y mismo mood => match alto (esperable > 70)."""
         # Creamos una visita COMPLETED a la misma location (comparte moods)
@@ -175,25 +373,53 @@ class LocationsAPITests(TestCase):
         )
 
         self.client.force_authenticate(user=self.user)
-        url = f"/api/v1/locations/{self.location.id}/vibe-match/"
-        res = self.client.get(url)
+        url = self.vibe_match_url
+        # Location + vibe match en una query
+        with self.assertNumQueries(2):
+            res = self.client.get(url)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
         # En este caso debería dar 100 (1/1 moods overlap), clamp 30..100
         self.assertTrue(res.data["vibe_match"] > 70)
 
+    def test_vibe_match_history_without_overlap_returns_min_in_one_query(self):
+        """Historial COMPLETED sin moods en común => 30 (clamp), calculado en una query."""
+        other_mood = Mood.objects.create(name="Relax", slug="relax", is_active=True)
+        visited = Location.objects.create(
+            name="Otro Bar",
+            status=Location.Status.APPROVED,
+            latitude=-33.44,
+            longitude=-70.65,
+            qr_code="QR-OTHER",
+        )
+        visited.moods.add(other_mood)
+        Visit.objects.create(
+            user=self.user, location=visited, status=Visit.Status.COMPLETED
+        )
 
-class HeatmapAPITests(TestCase):
-    def setUp(self):
-        self.client = APIClient()
-        self.user = User.objects.create_user(
+        self.client.force_authenticate(user=self.user)
+        url = self.vibe_match_url
+        # Location + vibe match
+        with self.assertNumQueries(2):
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["vibe_match"], 30)
+
+
+class HeatmapAPITests(APITestCase):
+    heatmap_url = "/api/v1/heatmap/"
+
+    @classmethod
+    def setUpTestData(cls):
+        # Usuario, locations y visits son de solo lectura en estos tests
+        cls.user = User.objects.create_user(
             username="heat-user",
             email="heat@example.com",
             password="pass12345",
             is_active=True,
         )
 
-        self.location_restaurant = Location.objects.create(
+        cls.location_restaurant = Location.objects.create(
             name="Heat Restaurant",
             city="Santiago",
             category=Location.Category.RESTAURANT,
@@ -202,7 +428,7 @@ class HeatmapAPITests(TestCase):
             longitude=-70.6693,
             qr_code="HEAT-R1",
         )
-        self.location_bar = Location.objects.create(
+        cls.location_bar = Location.objects.create(
             name="Heat Bar",
             city="Santiago",
             category=Location.Category.BAR,
@@ -212,32 +438,54 @@ class HeatmapAPITests(TestCase):
             qr_code="HEAT-B1",
         )
 
-        now = timezone.now()
-        # 2 visits on the same day/location -> value should aggregate to 2
-        Visit.objects.create(
-            user=self.user,
-            location=self.location_restaurant,
-            status=Visit.Status.COMPLETED,
-            checked_in_at=now - timedelta(hours=2),
+        # Timestamps dentro de días calendario fijos (TruncDay en UTC): con now - Nh los
+        # dos primeros caerían en días distintos entre 00:00 y 02:00 UTC
+        yesterday = (timezone.now() - timedelta(days=1)).replace(
+            hour=0, minute=0, second=0, microsecond=0
         )
-        Visit.objects.create(
-            user=self.user,
-            location=self.location_restaurant,
-            status=Visit.Status.COMPLETED,
-            checked_in_at=now - timedelta(hours=1),
+        visits = Visit.objects.bulk_create(
+            [
+                # 2 visits on the same day/location -> value should aggregate to 2
+                Visit(
+                    user=cls.user,
+                    location=cls.location_restaurant,
+                    status=Visit.Status.COMPLETED,
+                ),
+                Visit(
+                    user=cls.user,
+                    location=cls.location_restaurant,
+                    status=Visit.Status.COMPLETED,
+                ),
+                # 1 visit for a different category/location
+                Visit(
+                    user=cls.user,
+                    location=cls.location_bar,
+                    status=Visit.Status.ACTIVE,
+                ),
+            ]
         )
-        # 1 visit for a different category/location
-        Visit.objects.create(
-            user=self.user,
-            location=self.location_bar,
-            status=Visit.Status.ACTIVE,
-            checked_in_at=now - timedelta(days=1),
+        # checked_in_at es auto_now_add: los timestamps se fijan después, en un solo UPDATE
+        checked_in = [
+            yesterday + timedelta(hours=1),
+            yesterday + timedelta(hours=2),
+            yesterday - timedelta(days=1) + timedelta(hours=1),
+        ]
+        Visit.objects.filter(pk__in=[visit.pk for visit in visits]).update(
+            checked_in_at=Case(
+                *[
+                    When(pk=visit.pk, then=Value(timestamp))
+                    for visit, timestamp in zip(visits, checked_in)
+                ]
+            )
         )
 
-        self.heatmap_url = "/api/v1/heatmap/"
+    def setUp(self):
+        cache.clear()  # payload del heatmap cacheado por filtros + versión de datos
 
     def test_heatmap_is_public_and_returns_contract(self):
-        res = self.client.get(self.heatmap_url)
+        # Firma para el ETag + un solo GROUP BY (min/max se derivan de las filas)
+        with self.assertNumQueries(2):
+            res = self.client.get(self.heatmap_url)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
         self.assertIn("points", res.data)
@@ -273,6 +521,99 @@ class HeatmapAPITests(TestCase):
             res.data["points"][0]["location"]["id"], self.location_bar.id
         )
 
+    def test_heatmap_reads_query_params_directly(self):
+        future = (timezone.now() + timedelta(days=1)).isoformat()
+        res = self.client.get(
+            self.heatmap_url,
+            {"category": ["bar,restaurant", "other"], "source": "checkins", "to": future},
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        applied = res.data["appliedFilters"]
+        self.assertEqual(applied["category"], ["bar", "restaurant", "other"])
+        self.assertEqual(applied["source"], "visits")
+        self.assertIsNotNone(applied["to"])
+        self.assertEqual(len(res.data["points"]), 2)
+
+    def test_heatmap_etag_returns_304_until_data_changes(self):
+        res = self.client.get(self.heatmap_url)
+        etag = res["ETag"]
+
+        # Misma versión: 304 solo con la query de la firma
+        with self.assertNumQueries(1):
+            res = self.client.get(self.heatmap_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Otros filtros u otra visita => otra versión
+        res = self.client.get(
+            self.heatmap_url, {"threshold": 2}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        Visit.objects.create(user=self.user, location=self.location_bar)
+        res = self.client.get(self.heatmap_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["ETag"], etag)
+
+    def test_heatmap_payload_served_from_cache(self):
+        first = self.client.get(self.heatmap_url)
+        # Misma versión de datos: solo la query de la firma, payload desde cache
+        with self.assertNumQueries(1):
+            second = self.client.get(self.heatmap_url)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data, first.data)
+
+    def test_approved_location_requires_coordinates(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Location.objects.create(
+                name="Sin coords", status=Location.Status.APPROVED, qr_code="HEAT-X"
+            )
+
+    def test_heatmap_grid_bins_points_in_sql(self):
+        res = self.client.get(self.heatmap_url, {"grid": 1})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["appliedFilters"]["grid"], 1.0)
+        # Ambas locations caen en la celda (-33, -71); un punto por día
+        self.assertEqual(
+            sorted(point["value"] for point in res.data["points"]), [1, 2]
+        )
+        for point in res.data["points"]:
+            self.assertEqual((point["lat"], point["lng"]), (-33.0, -71.0))
+            self.assertIsNone(point["location"])
+
+    def test_heatmap_without_visits_skips_group_by(self):
+        # Solo la firma: con count 0 no se corre la query de puntos
+        with self.assertNumQueries(1):
+            res = self.client.get(self.heatmap_url, {"category": "attraction"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["points"], [])
+        self.assertEqual((res.data["min"], res.data["max"]), (0, 0))
+
+    def test_heatmap_filters_parsed_once_per_query_string(self):
+        _parse_heatmap_filters.cache_clear()
+        for _ in range(2):
+            res = self.client.get(self.heatmap_url, {"category": "bar"})
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(_parse_heatmap_filters.cache_info().hits, 1)
+
     def test_heatmap_invalid_palette_returns_400(self):
         res = self.client.get(self.heatmap_url, {"palette": "rainbow"})
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SeedVenuesCommandTests(TestCase):
+    def test_seed_is_idempotent_and_restores_data(self):
+        """seed_venues crea los venues con sus moods y, al re-ejecutarse, restaura sin duplicar."""
+        call_command("seed_venues", stdout=StringIO())
+
+        venue = Location.objects.get(qr_code="VEN-001")
+        self.assertEqual(venue.name, "Paramo")
+        self.assertEqual(
+            set(venue.moods.values_list("slug", flat=True)), {"chill", "romantico"}
+        )
+
+        Location.objects.filter(qr_code="VEN-002").update(name="Editado")
+        venue.moods.clear()
+        call_command("seed_venues", stdout=StringIO())
+
+        self.assertEqual(Location.objects.filter(qr_code__startswith="VEN-").count(), 50)
+        self.assertEqual(Location.objects.get(qr_code="VEN-002").name, "Baltra Bar")
+        self.assertEqual(venue.moods.count(), 2)
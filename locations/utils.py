@@ -1,9 +1,12 @@
 # locations/utils.py
 from __future__ import annotations
 
+import time
 from typing import Optional, Set
 
-from django.contrib.auth.models import AbstractBaseUser
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
 
 from .models import Visit, Location
 
@@ -12,41 +15,118 @@ DEFAULT_VIBE_MATCH = 70
 MIN_VIBE_MATCH = 30
 MAX_VIBE_MATCH = 100
 
+# Cache del vibe match por (usuario, location) y de los moods visitados por usuario.
+# El historial del usuario afecta a todas las locations, así que la invalidación es
+# por usuario: cada checkout cambia la "generación" del usuario y las entradas
+# anteriores dejan de leerse.
+VIBE_MATCH_CACHE_TTL = 120  # segundos; cubre también cambios de moods en el admin
 
-def calculate_vibe_match(user: AbstractBaseUser, location: Location) -> int:
+
+def get_visited_mood_ids(user: User) -> Set[int]:
+    """
+    Moods de las locations que el usuario visitó (COMPLETED). Una sola query, y
+    cacheada por usuario con la misma generación/TTL que el vibe match.
+    """
+    key = _visited_moods_cache_key(user.pk)
+    visited_mood_ids = cache.get(key)
+    if visited_mood_ids is None:
+        # isnull=False en SQL: las locations sin moods no traen filas con None
+        visited_mood_ids = set(
+            Visit.objects.filter(
+                user=user,
+                status=Visit.Status.COMPLETED,
+                location__moods__isnull=False,
+            )
+            .values_list("location__moods__id", flat=True)
+            .distinct()
+        )
+        cache.set(key, visited_mood_ids, VIBE_MATCH_CACHE_TTL)
+    return visited_mood_ids
+
+
+def calculate_vibe_match(
+    user: User | AnonymousUser,
+    location: Location,
+    visited_mood_ids: Optional[Set[int]] = None,
+) -> int:
     """
     Vibe Match MVP (determinístico, sin ML):
     - Usa overlap entre moods del location actual y moods de locations
       visitadas por el usuario con status COMPLETED.
     - Si el usuario no tiene historial COMPLETED o el location no tiene moods => 70
     - Clamp final: 30..100
+
+    visited_mood_ids: resultado de get_visited_mood_ids(user) si el caller ya lo tiene
+    (ej. serializando varias locations en el mismo request).
     """
 
     # Si por alguna razón llega un user no autenticado, devolvemos default seguro
-    if not getattr(user, "is_authenticated", False):
+    # (User y AnonymousUser definen is_authenticated: no hace falta getattr)
+    if not user.is_authenticated:
         return DEFAULT_VIBE_MATCH
 
-    # 1) Moods del location actual
-    location_mood_ids: Set[int] = set(location.moods.values_list("id", flat=True))
-    if not location_mood_ids:
+    if visited_mood_ids is None:
+        # Sin historial precalculado: cache, y si no está, overlap e historial en SQL
+        key = _vibe_match_cache_key(user.pk, location.pk)
+        match = cache.get(key)
+        if match is None:
+            match = _vibe_match_single_query(user, location)
+            cache.set(key, match, VIBE_MATCH_CACHE_TTL)
+        return match
+
+    # 1) Moods del location actual (.all() reutiliza prefetch_related("moods") si existe)
+    location_mood_ids: Set[int] = {mood.id for mood in location.moods.all()}
+    if not location_mood_ids or not visited_mood_ids:
         return DEFAULT_VIBE_MATCH
 
-    # 2) Moods de locations visitadas (COMPLETED) por el usuario
-    visited_mood_ids = set(
-        Visit.objects.filter(user=user, status=Visit.Status.COMPLETED)
-        .values_list("location__moods__id", flat=True)
-        .distinct()
-    )
+    # 2) Overlap con los moods visitados (COMPLETED) por el usuario
+    common = location_mood_ids.intersection(visited_mood_ids)
+    return _clamp_match(len(common), len(location_mood_ids))
 
-    # values_list puede traer None si alguna location no tiene moods
-    visited_mood_ids.discard(None)
 
-    if not visited_mood_ids:
+def _vibe_match_single_query(user: User, location: Location) -> int:
+    """
+    Mismo cálculo que calculate_vibe_match en una sola query: una fila por mood del
+    location con dos EXISTS (¿el usuario visitó ese mood? ¿tiene algún historial?).
+    """
+    completed = Visit.objects.filter(user=user, status=Visit.Status.COMPLETED)
+    rows = list(
+        location.moods.annotate(
+            visited=Exists(completed.filter(location__moods=OuterRef("pk"))),
+            has_history=Exists(completed.filter(location__moods__isnull=False)),
+        ).values_list("visited", "has_history")
+    )
+    # Sin moods en el location, o usuario sin historial COMPLETED => default
+    if not rows or not rows[0][1]:
         return DEFAULT_VIBE_MATCH
+    return _clamp_match(sum(visited for visited, _ in rows), len(rows))
 
-    # 3) Overlap
-    common = location_mood_ids.intersection(visited_mood_ids)
-    raw_pct = int((len(common) / len(location_mood_ids)) * 100)
 
-    # 4) Clamp 30..100
+def _clamp_match(common: int, total: int) -> int:
+    """Porcentaje de overlap, clamp 30..100."""
+    raw_pct = int((common / total) * 100)
     return max(MIN_VIBE_MATCH, min(raw_pct, MAX_VIBE_MATCH))
+
+
+def invalidate_vibe_match(user_id: int) -> None:
+    """
+    Descarta los vibe match y moods visitados cacheados del usuario
+    (llamar cuando completa una visita).
+    """
+    # El TTL de la generación iguala al de las entradas: si expira, todo lo que se
+    # cacheó con generaciones anteriores ya expiró también
+    cache.set(_vibe_generation_key(user_id), time.time_ns(), VIBE_MATCH_CACHE_TTL)
+
+
+def _vibe_generation_key(user_id: int) -> str:
+    return f"vibe:gen:{user_id}"
+
+
+def _vibe_match_cache_key(user_id: int, location_id: int) -> str:
+    generation = cache.get(_vibe_generation_key(user_id), 0)
+    return f"vibe:{user_id}:{generation}:{location_id}"
+
+
+def _visited_moods_cache_key(user_id: int) -> str:
+    generation = cache.get(_vibe_generation_key(user_id), 0)
+    return f"vibe:moods:{user_id}:{generation}"
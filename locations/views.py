@@ -1,21 +1,28 @@
 # locations/views.py
+import hashlib
+import json
 import logging
-import time
-from django.db import transaction
-from django.db.models import Count, Max, Min
-from django.db.models.functions import TruncDay
+from functools import lru_cache, partial
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, F, FloatField, Max, OuterRef, Value
+from django.db.models.functions import Round, TruncDay
+from django.http import QueryDict
 from django.utils import timezone
-from rest_framework import status, viewsets
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import generics, status, viewsets
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from .utils import calculate_vibe_match
+from .pagination import OptionalLimitOffsetPagination
+from .utils import calculate_vibe_match, invalidate_vibe_match
 
 from .models import Mood, Location, Visit, Collectible, Favorite, Review  # ✅ + Review
 from .serializers import (
     MoodSerializer,
     LocationListSerializer,
     LocationDetailSerializer,
+    LocationDetailVibeSerializer,
     VisitCheckinSerializer,
     VisitCheckoutSerializer,
     VisitSerializer,
@@ -27,6 +34,21 @@ from .serializers import (
 
 logger = logging.getLogger(__name__)
 
+HEATMAP_CACHE_TTL = 30  # segundos
+
+
+@lru_cache(maxsize=1024)
+def _parse_heatmap_filters(query_string):
+    """
+    Valida los filtros del heatmap una vez por query string distinto: (validated_data, None)
+    o (None, errors). La validación depende solo del string, así que los requests repetidos
+    reusan el resultado. Es compartido entre requests: solo lectura.
+    """
+    serializer = HeatmapFilterSerializer(data=QueryDict(query_string))
+    if serializer.is_valid():
+        return serializer.validated_data, None
+    return None, serializer.errors
+
 
 class MoodViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Mood.objects.filter(is_active=True)
@@ -40,18 +62,27 @@ class LocationViewSet(viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
         qs = (
             Location.objects.filter(status=Location.Status.APPROVED)
-            .prefetch_related("moods")
             .order_by("-created_at")  # 🔥 agregado
         )
+        qs = self.get_serializer_class().setup_eager_loading(qs)
 
         mood = self.request.query_params.get("mood")
         if mood:
-            qs = qs.filter(moods__slug=mood)
+            # Semi-join (EXISTS) sobre la tabla intermedia: sin JOIN que multiplique filas
+            qs = qs.filter(
+                Exists(
+                    Location.moods.through.objects.filter(
+                        location_id=OuterRef("pk"), mood__slug=mood
+                    )
+                )
+            )
 
         return qs
 
     def get_serializer_class(self):
         if self.action == "retrieve":
+            if self.request.user.is_authenticated:
+                return LocationDetailVibeSerializer
             return LocationDetailSerializer
         return LocationListSerializer
 
@@ -66,7 +97,10 @@ class VibeMatchAPIView(APIView):
 
     def get(self, request, id):
         try:
-            location = Location.objects.get(id=id, status=Location.Status.APPROVED)
+            # calculate_vibe_match solo usa location.pk (los moods los resuelve en SQL)
+            location = Location.objects.only("id").get(
+                id=id, status=Location.Status.APPROVED
+            )
         except Location.DoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
@@ -78,49 +112,14 @@ class HeatmapAPIView(APIView):
     permission_classes = (AllowAny,)
 
     def get(self, request):
-        started_at = time.perf_counter()
-        raw_categories = []
-        for raw_value in request.query_params.getlist("category"):
-            raw_categories.extend(
-                [category.strip() for category in raw_value.split(",") if category.strip()]
-            )
+        filters, errors = _parse_heatmap_filters(request.META.get("QUERY_STRING", ""))
+        if errors is not None:
+            # La latencia la registra TimingMiddleware
+            logger.warning("heatmap_fetch_error status=400 errors=%s", errors)
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
 
-        source = request.query_params.get("source")
-        if source == "checkins":
-            source = "visits"
-
-        filter_payload = {
-            "source": source or "visits",
-            "threshold": request.query_params.get("threshold", 0),
-            "palette": request.query_params.get("palette", "viridis"),
-        }
-        from_query = request.query_params.get("from")
-        to_query = request.query_params.get("to")
-        if from_query:
-            filter_payload["from_datetime"] = from_query
-        if to_query:
-            filter_payload["to_datetime"] = to_query
-        if raw_categories:
-            filter_payload["category"] = raw_categories
-
-        filter_serializer = HeatmapFilterSerializer(data=filter_payload)
-        if not filter_serializer.is_valid():
-            elapsed_ms = round((time.perf_counter() - started_at) * 1000)
-            logger.warning(
-                "heatmap_fetch_error latency_ms=%s status=400 errors=%s",
-                elapsed_ms,
-                filter_serializer.errors,
-            )
-            return Response(
-                filter_serializer.errors, status=status.HTTP_400_BAD_REQUEST
-            )
-        filters = filter_serializer.validated_data
-
-        queryset = Visit.objects.filter(
-            location__status=Location.Status.APPROVED,
-            location__latitude__isnull=False,
-            location__longitude__isnull=False,
-        )
+        # Las aprobadas siempre tienen coordenadas (constraint location_approved_has_coords)
+        queryset = Visit.objects.filter(location__status=Location.Status.APPROVED)
 
         from_datetime = filters.get("from_datetime")
         if from_datetime:
@@ -134,51 +133,65 @@ class HeatmapAPIView(APIView):
         if categories:
             queryset = queryset.filter(location__category__in=categories)
 
-        threshold = filters.get("threshold", 0)
-        points_qs = (
-            queryset.annotate(timestamp=TruncDay("checked_in_at"))
-            .values(
-                "location_id",
-                "location__name",
-                "location__city",
-                "location__latitude",
-                "location__longitude",
-                "timestamp",
+        # ETag de los datos que alimentan el heatmap: si el cliente ya tiene esta
+        # versión, 304 sin correr el GROUP BY ni serializar
+        digest, visit_count = self._heatmap_digest(queryset, filters)
+        etag = quote_etag(digest)
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            response["ETag"] = etag
+            return response
+
+        # El ETag ya identifica filtros + versión de los datos: sirve como key de cache
+        # (una visita nueva cambia la key, así que el cache no sirve datos viejos)
+        cache_key = f"heatmap:{digest}"
+        response_payload = cache.get(cache_key)
+        if response_payload is None:
+            # Sin visitas (la firma ya trae el count): none() no va a la DB y el
+            # payload vacío sale sin correr el GROUP BY
+            response_payload = self._build_payload(
+                queryset if visit_count else queryset.none(), filters
             )
-            .annotate(value=Count("id"))
-            .filter(value__gte=threshold)
-            .order_by("timestamp", "location_id")
+            cache.set(cache_key, response_payload, HEATMAP_CACHE_TTL)
+
+        threshold = filters.get("threshold", 0)
+        logger.info(
+            "heatmap_fetch_success points=%s threshold=%s categories=%s",
+            len(response_payload["points"]),
+            threshold,
+            ",".join(categories or []),
         )
+        response = Response(response_payload, status=status.HTTP_200_OK)
+        response["ETag"] = etag
+        return response
 
-        points = []
-        values = []
-        for point in points_qs:
-            value = point["value"]
-            values.append(value)
-            timestamp = point["timestamp"]
-            points.append(
-                {
-                    "value": value,
-                    "unit": "visits",
-                    "lat": float(point["location__latitude"]),
-                    "lng": float(point["location__longitude"]),
-                    "timestamp": timestamp.isoformat() if timestamp else None,
-                    "location": {
-                        "id": point["location_id"],
-                        "name": point["location__name"],
-                        "city": point["location__city"],
-                    },
-                }
-            )
+    @staticmethod
+    def _build_payload(queryset, filters):
+        """Puntos (visitas por location, o por celda si hay grid, por día) + metadata."""
+        from_datetime = filters.get("from_datetime")
+        to_datetime = filters.get("to_datetime")
+        categories = filters.get("category")
+        threshold = filters.get("threshold", 0)
+        grid = filters.get("grid")
+        points = (
+            HeatmapAPIView._grid_points(queryset, grid, threshold)
+            if grid
+            else HeatmapAPIView._location_points(queryset, threshold)
+        )
 
-        aggregate = points_qs.aggregate(min=Min("value"), max=Max("value"))
-        response_payload = {
+        # min/max salen de las mismas filas (sin otra query)
+        values = [point["value"] for point in points]
+        return {
             "points": points,
-            "min": aggregate["min"] if values else 0,
-            "max": aggregate["max"] if values else 0,
+            "min": min(values, default=0),
+            "max": max(values, default=0),
             "normalizationMeta": {
                 "mode": "none",
-                "note": "Raw visit counts per location per day.",
+                "note": (
+                    "Raw visit counts per grid cell per day."
+                    if grid
+                    else "Raw visit counts per location per day."
+                ),
             },
             "appliedFilters": {
                 "from": from_datetime.isoformat() if from_datetime else None,
@@ -187,17 +200,106 @@ class HeatmapAPIView(APIView):
                 "category": categories or [],
                 "threshold": threshold,
                 "palette": filters.get("palette", "viridis"),
+                "grid": grid,
             },
         }
-        elapsed_ms = round((time.perf_counter() - started_at) * 1000)
-        logger.info(
-            "heatmap_fetch_success latency_ms=%s points=%s threshold=%s categories=%s",
-            elapsed_ms,
-            len(points),
-            threshold,
-            ",".join(categories or []),
+
+    @staticmethod
+    def _location_points(queryset, threshold):
+        """Un punto por location por día."""
+        points_qs = (
+            queryset.annotate(timestamp=TruncDay("checked_in_at"))
+            .values(
+                "location_id",
+                "location__name",
+                "location__city",
+                "location__latitude",
+                "location__longitude",
+                "timestamp",
+            )
+            .annotate(value=Count("id"))
+            .filter(value__gte=threshold)
+            .order_by("timestamp", "location_id")
+            # values() de arriba fija el GROUP BY; values_list() solo da tuplas (sin
+            # armar un dict intermedio por fila)
+            .values_list(
+                "location_id",
+                "location__name",
+                "location__city",
+                "location__latitude",
+                "location__longitude",
+                "timestamp",
+                "value",
+            )
+        )
+
+        # Una sola query (GROUP BY location/día).
+        # iterator(): las filas no quedan además en el result cache del queryset.
+        # latitude/longitude ya son float (FloatField): sin conversión por fila
+        return [
+            {
+                "value": value,
+                "unit": "visits",
+                "lat": lat,
+                "lng": lng,
+                "timestamp": timestamp.isoformat() if timestamp else None,
+                "location": {"id": location_id, "name": name, "city": city},
+            }
+            for location_id, name, city, lat, lng, timestamp, value in points_qs.iterator(
+                chunk_size=2000
+            )
+        ]
+
+    @staticmethod
+    def _grid_points(queryset, grid, threshold):
+        """
+        Un punto por celda de la grilla por día: el binning se hace en SQL
+        (ROUND(lat / grid) * grid), así la query devuelve O(celdas) filas y no
+        O(locations). lat/lng son el centro de la celda; no hay location asociada.
+        """
+        cell = Value(grid, output_field=FloatField())
+        points_qs = (
+            queryset.annotate(
+                timestamp=TruncDay("checked_in_at"),
+                cell_lat=Round(F("location__latitude") / cell) * cell,
+                cell_lng=Round(F("location__longitude") / cell) * cell,
+            )
+            .values("cell_lat", "cell_lng", "timestamp")
+            .annotate(value=Count("id"))
+            .filter(value__gte=threshold)
+            .order_by("timestamp", "cell_lat", "cell_lng")
+            .values_list("cell_lat", "cell_lng", "timestamp", "value")
+        )
+        return [
+            {
+                "value": value,
+                "unit": "visits",
+                # round(): quita el ruido de punto flotante de la multiplicación
+                "lat": round(lat, 6),
+                "lng": round(lng, 6),
+                "timestamp": timestamp.isoformat() if timestamp else None,
+                "location": None,
+            }
+            for lat, lng, timestamp, value in points_qs.iterator(chunk_size=2000)
+        ]
+
+    @staticmethod
+    def _heatmap_digest(queryset, filters):
+        """
+        Hash (ETag y key de cache) a partir de los filtros y de una firma barata de las visitas filtradas
+        (un solo aggregate, sin GROUP BY): cantidad, última visita e id más alto,
+        y la última edición de sus locations (nombre/coords/categoría).
+        Retorna (hash, cantidad de visitas).
+        """
+        signature = queryset.aggregate(
+            count=Count("id"),
+            max_id=Max("id"),
+            last_checkin=Max("checked_in_at"),
+            last_location_update=Max("location__updated_at"),
         )
-        return Response(response_payload, status=status.HTTP_200_OK)
+        raw = json.dumps([filters, signature], sort_keys=True, default=str)
+        digest = hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+        return digest, signature["count"]
 
 
 class VisitCheckinAPIView(APIView):
@@ -218,14 +320,11 @@ class VisitCheckinAPIView(APIView):
 
         # ✅ Antes: si ya tenía collectible => 409
         # ✅ Ahora: permitir revisita; solo no crear collectible duplicado
-        collectible_awarded = False
-        if not Collectible.objects.filter(
+        # get_or_create resuelve la carrera entre dos checkins simultáneos contra
+        # el unique (user, location) en vez de fallar con IntegrityError
+        _, collectible_awarded = Collectible.objects.get_or_create(
             user=request.user, location=location
-        ).exists():
-            Collectible.objects.create(
-                user=request.user, location=location, awarded_at=timezone.now()
-            )
-            collectible_awarded = True
+        )
 
         visit = Visit.objects.create(
             user=request.user,
@@ -246,11 +345,14 @@ class VisitCheckoutAPIView(APIView):
     @transaction.atomic  # ✅ para que Review + Visit se guarden juntos
     def post(self, request, id):
         try:
-            visit = Visit.objects.get(id=id)
+            # Lock de la fila: dos checkouts simultáneos de la misma visita se serializan
+            # y el segundo ve status COMPLETED (409) en vez de chocar en el INSERT.
+            # of=("self",): no bloquea tablas de joins
+            visit = Visit.objects.select_for_update(of=("self",)).get(id=id)
         except Visit.DoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
-        if visit.user != request.user:
+        if visit.user_id != request.user.pk:
             return Response(status=status.HTTP_403_FORBIDDEN)
 
         if visit.status != Visit.Status.ACTIVE:
@@ -259,47 +361,55 @@ class VisitCheckoutAPIView(APIView):
         serializer = VisitCheckoutSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        # ✅ NUEVO: persistir rating en Review (si ya existe, evitamos duplicado)
-        if hasattr(visit, "review"):
+        # ✅ NUEVO: persistir rating en Review. Review.visit es OneToOne: si ya
+        # existe, el unique de la DB lo rechaza (sin SELECT previo de la review)
+        data = serializer.validated_data
+        try:
+            with transaction.atomic():
+                review = Review.objects.create(
+                    user=request.user,
+                    location_id=visit.location_id,
+                    visit=visit,
+                    service_score=data["service_score"],
+                    quality_score=data["quality_score"],
+                    price_score=data["price_score"],
+                    vibe_score=data["vibe_score"],
+                    comment=data.get("comment", ""),
+                )
+        except IntegrityError:
             # ya fue calificada (por seguridad)
             return Response(
                 {"error": "This visit is already reviewed."},
                 status=status.HTTP_409_CONFLICT,
             )
 
-        data = serializer.validated_data
-        review = Review.objects.create(
-            user=request.user,
-            location=visit.location,
-            visit=visit,
-            service_score=data["service_score"],
-            quality_score=data["quality_score"],
-            price_score=data["price_score"],
-            vibe_score=data["vibe_score"],
-            comment=data.get("comment", ""),
-        )
-
         visit.status = Visit.Status.COMPLETED
         visit.checked_out_at = timezone.now()
-        visit.save()
+        visit.save(update_fields=["status", "checked_out_at"])
+        # El historial COMPLETED cambió: el vibe match cacheado del usuario ya no vale
+        transaction.on_commit(partial(invalidate_vibe_match, request.user.pk))
 
         return Response({"review_id": review.id}, status=status.HTTP_200_OK)
 
 
-class MyVisitsAPIView(APIView):
+class MyVisitsAPIView(generics.ListAPIView):
     permission_classes = (IsAuthenticated,)
+    serializer_class = VisitSerializer
+    pagination_class = OptionalLimitOffsetPagination
 
-    def get(self, request):
-        qs = Visit.objects.filter(user=request.user).select_related("location")
-        return Response(VisitSerializer(qs, many=True).data)
+    def get_queryset(self):
+        qs = Visit.objects.filter(user=self.request.user).order_by("-checked_in_at", "-id")
+        return VisitSerializer.setup_eager_loading(qs)
 
 
-class MyCollectiblesAPIView(APIView):
+class MyCollectiblesAPIView(generics.ListAPIView):
     permission_classes = (IsAuthenticated,)
+    serializer_class = CollectibleSerializer
+    pagination_class = OptionalLimitOffsetPagination
 
-    def get(self, request):
-        qs = Collectible.objects.filter(user=request.user).select_related("location")
-        return Response(CollectibleSerializer(qs, many=True).data)
+    def get_queryset(self):
+        qs = Collectible.objects.filter(user=self.request.user).order_by("-awarded_at", "-id")
+        return CollectibleSerializer.setup_eager_loading(qs)
 
 
 class FavoriteToggleAPIView(APIView):
@@ -309,34 +419,51 @@ class FavoriteToggleAPIView(APIView):
         serializer = FavoriteToggleSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        try:
-            location = Location.objects.get(id=serializer.validated_data["location_id"])
-        except Location.DoesNotExist:
+        location_id = serializer.validated_data["location_id"]
+        # Quitar: un solo DELETE (Favorite no tiene cascadas ni señales => fast delete).
+        # Si borró algo, la location existe por FK y no hay más que hacer
+        deleted, _ = Favorite.objects.filter(
+            user=request.user, location_id=location_id
+        ).delete()
+        if deleted:
+            return Response(status=status.HTTP_200_OK)
+
+        # Agregar: solo hace falta saber que existe, no se hidrata la fila de Location
+        if not Location.objects.filter(id=location_id).exists():
             return Response(
                 {"error": "Location not found"}, status=status.HTTP_404_NOT_FOUND
             )
-
-        fav, created = Favorite.objects.get_or_create(
-            user=request.user, location=location
-        )
-        if not created:
-            fav.delete()
-            return Response(status=status.HTTP_200_OK)
+        try:
+            with transaction.atomic():
+                Favorite.objects.create(user=request.user, location_id=location_id)
+        except IntegrityError:
+            # Solo es "ya existe" si otro request lo creó entre el DELETE y el INSERT;
+            # si no (ej. la location se borró entretanto => FK), no hay favorito
+            if not Favorite.objects.filter(
+                user=request.user, location_id=location_id
+            ).exists():
+                return Response(
+                    {"error": "Location not found"}, status=status.HTTP_404_NOT_FOUND
+                )
 
         return Response(status=status.HTTP_201_CREATED)
 
 
-class MyFavoritesAPIView(APIView):
+class MyFavoritesAPIView(generics.ListAPIView):
     permission_classes = (IsAuthenticated,)
+    serializer_class = FavoriteSerializer
+    pagination_class = OptionalLimitOffsetPagination
 
-    def get(self, request):
-        qs = Favorite.objects.filter(user=request.user).select_related("location")
-        return Response(FavoriteSerializer(qs, many=True).data)
+    def get_queryset(self):
+        qs = Favorite.objects.filter(user=self.request.user).order_by("-created_at", "-id")
+        return FavoriteSerializer.setup_eager_loading(qs)
 
 
 class FavoriteDeleteAPIView(APIView):
     permission_classes = (IsAuthenticated,)
 
     def delete(self, request, location_id):
+        # Favorite no tiene FKs entrantes ni señales: Django hace fast delete
+        # (un solo DELETE ... WHERE, sin SELECT previo del collector)
         Favorite.objects.filter(user=request.user, location_id=location_id).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -1,4 +1,5 @@
 import os
+import sys
 import django
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "django_rest_main.settings")
@@ -7,11 +8,20 @@ django.setup()
 from django.urls import get_resolver
 
 def list_urls(urlpatterns, prefix=""):
-    for p in urlpatterns:
-        if hasattr(p, "url_patterns"):  # include()
-            list_urls(p.url_patterns, prefix + str(p.pattern))
+    """Rutas completas en orden de resolución (pila explícita en vez de recursión)."""
+    lines = []
+    stack = [(iter(urlpatterns), prefix)]
+    while stack:
+        patterns, prefix = stack[-1]
+        for p in patterns:
+            if hasattr(p, "url_patterns"):  # include(): se recorre antes de seguir
+                stack.append((iter(p.url_patterns), prefix + str(p.pattern)))
+                break
+            lines.append(prefix + str(p.pattern))
         else:
-            print(prefix + str(p.pattern))
+            stack.pop()
+    return lines
 
 resolver = get_resolver()
-list_urls(resolver.url_patterns)
+# Una sola escritura en vez de un print() por ruta
+sys.stdout.write("\n".join(list_urls(resolver.url_patterns)) + "\n")